@@ -1,5 +1,7 @@
 
+import threading
 import warnings
+from multiprocessing.pool import ThreadPool
 
 from django.conf import settings
 from django.conf.urls.defaults import *
@@ -10,6 +12,7 @@ from django.utils.cache import patch_cache_control
 from django.views.decorators.csrf import csrf_exempt
 
 from restumize import http
+from restumize.batch import BatchHandler
 from restumize.exceptions import NotRegistered, BadRequest
 from restumize.serializers import Serializer
 
@@ -25,11 +28,23 @@ class Api(object):
     Optionally supplying ``api_name`` allows you to name the API. Generally,
     this is done with version numbers (i.e. ``v1``, ``v2``, etc.) but can
     be named any string.
+
+    Supplying ``batch=True`` also exposes a ``batch/`` resource that runs
+    several requests against the registered resources in one round trip
+    (see ``restumize.batch.BatchHandler``). ``batch_workers`` bounds the
+    thread pool used for independent entries and ``max_batch_size`` the
+    number of entries accepted per batch.
     """
-    def __init__(self, api_name="v1"):
+    def __init__(self, api_name="v1", batch=False, batch_workers=4, max_batch_size=20):
         self.api_name = api_name
+        self.batch = batch
+        self.batch_workers = batch_workers
+        self.max_batch_size = max_batch_size
         self._registry = {}
         self._canonicals = {}
+        self._shared_resources = {}
+        self._batch_pool = None
+        self._batch_pool_lock = threading.Lock()
 
     def register(self, resource_class, resource_name=None, canonical=True):
         if resource_name is None:
@@ -53,56 +68,95 @@ class Api(object):
         """
         @csrf_exempt
         def wrapper(request, *args, **kwargs):
-            resource = resource_class(request.GET, request.POST, request.FILES)
-            try:
-                callback = getattr(resource, view)
-                response = callback(request, *args, **kwargs)
-
-                if request.is_ajax() and not response.has_header("Cache-Control"):
-                    # IE excessively caches XMLHttpRequests, so we're disabling
-                    # the browser cache here.
-                    # See http://www.enhanceie.com/ie/bugs.asp for details.
-                    patch_cache_control(response, no_cache=True)
-                
-                return response
-            except BadRequest, e:
-                data = {
-                    "error": unicode(e.args[0]),
-                }
-                desired_format = resource._determine_format(request)
-                serialized = resource._serialize(request, data, desired_format)
-
-                return http.HttpBadRequest(serialized)
-            except ValidationError, e:
-                data = {
-                    "error": unicode(', '.join(e.messages)),
-                }
-                desired_format = resource._determine_format(request)
-                serialized = resource._serialize(request, data, desired_format)
-                
-                return http.HttpBadRequest(serialized)
-            except Exception, e:
-                if hasattr(e, 'response'):
-                    return e.response
-
-                # A real, non-expected exception.
-                # Handle the case where the full traceback is more helpful
-                # than the serialized error.
-                if settings.DEBUG and getattr(settings, 'RESTO_FULL_DEBUG', False):
-                    raise
-
-                # Re-raise the error to get a proper traceback when the error
-                # happend during a test case
-                if request.META.get('SERVER_NAME') == 'testserver':
-                    raise
-
-                # Rather than re-raising, we're going to things similar to
-                # what Django does. The difference is returning a serialized
-                # error message.
-                return resource._handle_500(request, e)
+            resource = self.get_resource(resource_class, request)
+            return self.call_view(resource, view, request, *args, **kwargs)
 
         return wrapper
 
+    def get_resource(self, resource_class, request):
+        """
+        Returns the handler instance that should serve ``request``.
+
+        Reusable handlers are instantiated once and shared between requests;
+        everything request-specific lives in a ``RequestContext``. The body is
+        only parsed later on, when the handler builds that context.
+        """
+        if not resource_class._meta.reusable:
+            return resource_class(request.GET)
+
+        try:
+            return self._shared_resources[resource_class]
+        except KeyError:
+            resource = self._shared_resources[resource_class] = resource_class()
+            return resource
+
+    def call_view(self, resource, view, request, *args, **kwargs):
+        """
+        Calls ``view`` on ``resource``, turning exceptions into serialized
+        error responses.
+        """
+        try:
+            callback = getattr(resource, view)
+            response = callback(request, *args, **kwargs)
+
+            if request.is_ajax() and not response.has_header("Cache-Control"):
+                # IE excessively caches XMLHttpRequests, so we're disabling
+                # the browser cache here.
+                # See http://www.enhanceie.com/ie/bugs.asp for details.
+                patch_cache_control(response, no_cache=True)
+            
+            return response
+        except BadRequest, e:
+            data = {
+                "error": unicode(e.args[0]),
+            }
+            desired_format = resource._determine_format(request)
+            serialized = resource._serialize(request, data, desired_format)
+
+            return e.response_class(serialized)
+        except ValidationError, e:
+            data = {
+                "error": unicode(', '.join(e.messages)),
+            }
+            desired_format = resource._determine_format(request)
+            serialized = resource._serialize(request, data, desired_format)
+            
+            return http.HttpBadRequest(serialized)
+        except Exception, e:
+            if hasattr(e, 'response'):
+                return e.response
+
+            # A real, non-expected exception.
+            # Handle the case where the full traceback is more helpful
+            # than the serialized error.
+            if settings.DEBUG and getattr(settings, 'RESTO_FULL_DEBUG', False):
+                raise
+
+            # Re-raise the error to get a proper traceback when the error
+            # happend during a test case
+            if request.META.get('SERVER_NAME') == 'testserver':
+                raise
+
+            # Rather than re-raising, we're going to things similar to
+            # what Django does. The difference is returning a serialized
+            # error message.
+            return resource._handle_500(request, e)
+
+    def get_batch_pool(self):
+        """
+        Returns the bounded thread pool used to run independent batch
+        entries in parallel, or ``None`` if ``batch_workers`` is zero.
+        """
+        if not self.batch_workers:
+            return None
+
+        if self._batch_pool is None:
+            with self._batch_pool_lock:
+                if self._batch_pool is None:
+                    self._batch_pool = ThreadPool(self.batch_workers)
+
+        return self._batch_pool
+
     def resource_url(self, name):
         resource_class = self._registry[name]
 
@@ -132,6 +186,11 @@ class Api(object):
 
         urlpatterns = self.prepend_urls()
 
+        if self.batch:
+            urlpatterns += patterns('',
+                url(r"^(?P<api_name>%s)/batch%s$" % (self.api_name, trailing_slash()), self.wrap_view(BatchHandler), {'api': self}, name="api_batch"),
+            )
+
         urlpatterns += patterns('',
             *pattern_list
         )
@@ -29,14 +29,14 @@ class ReadOnlyAuthorization(Authorization):
     """
     Default Authentication class for ``Resource`` objects.
 
-    Only allows GET requests.
+    Only allows GET (and HEAD) requests.
     """
 
     def is_authorized(self, request, object=None):
         """
-        Allow any ``GET`` request.
+        Allow any ``GET`` or ``HEAD`` request.
         """
-        if request.method == 'GET':
+        if request.method in ('GET', 'HEAD'):
             return True
         else:
             return False
@@ -44,9 +44,9 @@ class ReadOnlyAuthorization(Authorization):
 
 class ReadWriteAuthorization(Authorization):
     """
-    Allows GET and POST requests.
+    Allows GET, HEAD and POST requests.
     """
-    allowed_method = ['GET', 'POST']
+    allowed_method = ['GET', 'HEAD', 'POST']
 
     def is_authorized(self, request, object=None):
         """
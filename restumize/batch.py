@@ -0,0 +1,221 @@
+import copy
+
+from django.db import connections
+from django.http import HttpResponse, QueryDict
+from django.utils.datastructures import MultiValueDict
+
+from restumize import http
+from restumize.authorization import Authorization
+from restumize.exceptions import BadRequest
+from restumize.handler import BaseHandler, get_request_body
+
+
+# Methods whose entries have no side effects and may run in parallel.
+SAFE_METHODS = ('GET', 'HEAD')
+
+
+class BatchHandler(BaseHandler):
+    """
+    Runs several requests against the resources of an ``Api`` in a single
+    HTTP round trip.
+
+    Expects a ``POST`` whose body is a list of entries like::
+
+        [
+            {"method": "GET", "resource_name": "user", "params": {"id": 1}},
+            {"method": "POST", "resource_name": "note", "params": {"text": "hi"}}
+        ]
+
+    Each entry is routed through the registered handler's ``_dispatch`` and
+    the results are returned as a list of ``status``, ``content_type`` and
+    ``body`` envelopes, in the order of the entries.
+
+    Authentication runs once per distinct authentication backend for the
+    whole batch instead of once per entry. Consecutive ``GET``/``HEAD``
+    entries are independent and run in parallel on the ``Api`` thread pool;
+    every other entry runs on its own, in order.
+    """
+    class Meta:
+        resource_name = 'batch'
+        allowed_methods = ['post']
+        authorization = Authorization()
+        reusable = True
+
+    def post(self, request, context=None, api=None, **kwargs):
+        entries = self._get_entries(request, api)
+        credentials = self._authenticate_entries(request, api, entries)
+        pool = api.get_batch_pool()
+        results = []
+        pending = []
+
+        for entry in entries:
+            if pool is not None and entry['method'] in SAFE_METHODS:
+                pending.append(entry)
+                continue
+
+            if pending:
+                results.extend(pool.map(lambda item: self._run_pooled_entry(request, api, item, credentials), pending))
+                pending = []
+
+            results.append(self._run_entry(request, api, entry, credentials))
+
+        if pending:
+            results.extend(pool.map(lambda item: self._run_pooled_entry(request, api, item, credentials), pending))
+
+        return results
+
+    def _get_entries(self, request, api):
+        """
+        Deserializes and normalizes the batch entries from the request body.
+        """
+        entries = get_request_body(request, self._meta.serializer)[0]
+
+        if entries is None:
+            # Not sent with a serializer format; assume JSON.
+            entries = self._meta.serializer.deserialize(request.body, format='application/json')
+
+        if isinstance(entries, dict):
+            entries = entries.get('objects')
+
+        if not isinstance(entries, list):
+            raise BadRequest('The batch must be a list of requests.')
+
+        if len(entries) > api.max_batch_size:
+            raise BadRequest('A batch can hold at most %d requests.' % api.max_batch_size)
+
+        normalized = []
+
+        for entry in entries:
+            if not isinstance(entry, dict) or not entry.get('resource_name'):
+                raise BadRequest('Every batch entry needs a "resource_name".')
+
+            params = entry.get('params') or {}
+
+            if not isinstance(params, dict):
+                raise BadRequest('The "params" of a batch entry must be a hash.')
+
+            normalized.append({
+                'method': str(entry.get('method') or 'GET').upper(),
+                'resource_name': entry['resource_name'],
+                'params': params,
+            })
+
+        return normalized
+
+    def _authenticate_entries(self, request, api, entries):
+        """
+        Authenticates the batch once per distinct authentication backend.
+
+        Returns a dictionary mapping the ``id`` of each backend to either the
+        requestor's identifier or the response that rejected the request.
+        """
+        credentials = {}
+
+        for entry in entries:
+            resource_class = api._registry.get(entry['resource_name'])
+
+            if resource_class is None:
+                continue
+
+            authentication = resource_class._meta.authentication
+
+            if id(authentication) in credentials:
+                continue
+
+            auth_result = authentication.is_authenticated(request)
+
+            if auth_result is True:
+                credentials[id(authentication)] = authentication.get_identifier(request)
+            elif isinstance(auth_result, HttpResponse):
+                credentials[id(authentication)] = auth_result
+            else:
+                credentials[id(authentication)] = http.HttpUnauthorized()
+
+        return credentials
+
+    def _run_entry(self, request, api, entry, credentials):
+        """
+        Dispatches a single entry and wraps its response in an envelope.
+        """
+        resource_class = api._registry.get(entry['resource_name'])
+
+        if resource_class is None:
+            return {
+                'status': http.HttpNotFound.status_code,
+                'content_type': None,
+                'body': "Resource '%s' is not registered." % entry['resource_name'],
+            }
+
+        credential = credentials[id(resource_class._meta.authentication)]
+
+        if isinstance(credential, HttpResponse):
+            response = credential
+        else:
+            sub_request = self._build_request(request, entry)
+            sub_request._restumize_identifier = credential
+            resource = api.get_resource(resource_class, sub_request)
+            response = api.call_view(resource, '_view', sub_request, api_name=api.api_name, resource_name=entry['resource_name'])
+
+        if getattr(response, 'streaming', False):
+            body = ''.join(response.streaming_content)
+        else:
+            body = response.content
+
+        return {
+            'status': response.status_code,
+            'content_type': response.get('Content-Type'),
+            'body': body,
+        }
+
+    def _run_pooled_entry(self, request, api, entry, credentials):
+        """
+        Runs an entry on a thread of the batch pool.
+
+        The database connections the entry opened belong to the pool thread,
+        which outlives the request, so they are closed once it is done.
+        """
+        try:
+            return self._run_entry(request, api, entry, credentials)
+        finally:
+            for connection in connections.all():
+                connection.close()
+
+    def _build_request(self, request, entry):
+        """
+        Builds the request for a batch entry out of the batch request.
+
+        Query string parameters of the batch (like ``format``) are kept, the
+        entry's ``params`` become the ``GET`` data of safe methods and the
+        ``POST``/``PUT``/``PATCH`` data of every other method.
+        """
+        method = entry['method']
+        params = QueryDict('', mutable=True)
+
+        for key, value in entry['params'].items():
+            if isinstance(value, (list, tuple)):
+                params.setlist(key, list(value))
+            else:
+                params[key] = value
+
+        sub_request = copy.copy(request)
+        sub_request.method = method
+        # Entries end up in the batch envelope, which is encoded as a whole.
+        sub_request.META = dict(request.META)
+        sub_request.META.pop('HTTP_ACCEPT_ENCODING', None)
+        sub_request._files = MultiValueDict()
+
+        if method in SAFE_METHODS:
+            query = request.GET.copy()
+            for key in params:
+                query.setlist(key, params.getlist(key))
+            sub_request.GET = query
+            sub_request._post = QueryDict('')
+            sub_request._restumize_body = (None, sub_request._post, sub_request._files)
+        else:
+            sub_request._post = params
+            # Marks the body as already processed for ``get_request_body``
+            # and ``convert_post_to_VERB``.
+            sub_request._restumize_body = (entry['params'], params, sub_request._files)
+            setattr(sub_request, method, params)
+
+        return sub_request
@@ -1,4 +1,14 @@
-from django.core.cache import cache
+import math
+import random
+import sys
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache, get_cache
+from django.db.models.signals import post_save, post_delete
+
+from restumize.utils.lru import LRUCache
 
 
 class NoCache(object):
@@ -19,3 +29,394 @@ class NoCache(object):
         """
         pass
 
+    def release(self, key):
+        """
+        Called instead of ``set`` when a value that missed won't be cached
+        after all. No-op.
+        """
+        pass
+
+
+class SimpleCache(NoCache):
+    """
+    Uses Django's current ``CACHES`` configuration to store cached data.
+
+    Accepts a number of optional kwargs::
+
+        * ``timeout`` - the number of seconds cached data is kept when no
+          timeout is given to ``set``. Default is 60 seconds.
+        * ``cache_name`` - the alias of the Django cache to use. Default is
+          ``default``.
+    """
+    def __init__(self, timeout=60, cache_name='default'):
+        self.timeout = timeout
+        self.cache_name = cache_name
+        self._cache = None
+
+    @property
+    def cache(self):
+        """
+        The Django cache backend, resolved on first use.
+        """
+        if self._cache is None:
+            self._cache = get_cache(self.cache_name)
+
+        return self._cache
+
+    def get(self, key):
+        """
+        Gets a key from the cache. Returns ``None`` if the key is not found.
+        """
+        return self.cache.get(key)
+
+    def set(self, key, value, timeout=None):
+        """
+        Sets a key-value in the cache.
+
+        Optionally accepts a ``timeout`` in seconds. Defaults to the
+        ``timeout`` the cache was created with.
+        """
+        if timeout is None:
+            timeout = self.timeout
+
+        self.cache.set(key, value, timeout)
+
+
+class TieredCache(SimpleCache):
+    """
+    Keeps a small, per-process LRU cache in front of the shared Django cache,
+    so hot keys are served from memory without a network round trip.
+
+    Accepts the kwargs of ``SimpleCache`` plus::
+
+        * ``local_timeout`` - the number of seconds entries are kept in
+          process memory. Never more than the shared timeout. Default is 5
+          seconds.
+        * ``max_entries`` - the number of entries kept in process memory.
+          Default is 1000.
+        * ``max_size`` - the approximate number of bytes kept in process
+          memory. Default is 10MB.
+
+    Counts ``local_hits``, ``shared_hits`` and ``misses`` (see ``stats``).
+    """
+    def __init__(self, timeout=60, cache_name='default', local_timeout=5, max_entries=1000, max_size=10 * 1024 * 1024):
+        super(TieredCache, self).__init__(timeout=timeout, cache_name=cache_name)
+        self.local_timeout = local_timeout
+        self.local = LRUCache(max_entries=max_entries, max_size=max_size)
+        self.shared_hits = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Gets a key from process memory, falling back to the shared cache.
+        Returns ``None`` if the key is not found.
+        """
+        value = self.local.get(key)
+
+        if value is not None:
+            return value
+
+        value = super(TieredCache, self).get(key)
+
+        if value is not None:
+            with self._lock:
+                self.shared_hits += 1
+
+            self.local.set(key, value, get_size(value), self.local_timeout)
+
+        return value
+
+    def set(self, key, value, timeout=None):
+        """
+        Sets a key-value in both the shared cache and process memory.
+        """
+        if timeout is None:
+            timeout = self.timeout
+
+        super(TieredCache, self).set(key, value, timeout)
+        self.local.set(key, value, get_size(value), min(timeout, self.local_timeout))
+
+    def stats(self):
+        """
+        Returns the hit and miss counters of the cache.
+        """
+        return {
+            'local_hits': self.local.hits,
+            'shared_hits': self.shared_hits,
+            'misses': self.local.misses - self.shared_hits,
+        }
+
+
+def get_size(value):
+    """
+    Estimates the memory taken by a cached value, in bytes.
+
+    Cached responses are dictionaries of strings, so only those are measured
+    precisely.
+    """
+    if isinstance(value, basestring):
+        return len(value)
+
+    if isinstance(value, dict):
+        return sum(get_size(item) for item in value.itervalues())
+
+    return sys.getsizeof(value)
+
+
+class RefreshAheadCache(SimpleCache):
+    """
+    Protects expensive resources from cache stampedes.
+
+    Entries are kept ``stale_timeout`` seconds past their ``timeout``. When
+    an entry goes stale, or randomly a little before that (the closer to
+    expiry and the slower it was to compute, the likelier), a single worker
+    takes a lock in the Django cache and gets a miss, so it rebuilds the
+    entry while every other worker keeps getting the stale value.
+
+    Accepts the kwargs of ``SimpleCache`` plus::
+
+        * ``stale_timeout`` - the number of seconds a stale value is served
+          while it is rebuilt. Default is 300 seconds.
+        * ``lock_timeout`` - the number of seconds the rebuild lock is held
+          at most. Default is 30 seconds.
+        * ``lock_wait`` - the number of seconds a worker waits for another
+          one to build a missing entry before building it too. Default is 1
+          second.
+        * ``beta`` - how eagerly entries are refreshed before they expire;
+          ``0`` disables early refresh. Default is 1.
+    """
+    poll_interval = 0.05
+
+    def __init__(self, timeout=60, cache_name='default', stale_timeout=300, lock_timeout=30, lock_wait=1, beta=1.0):
+        super(RefreshAheadCache, self).__init__(timeout=timeout, cache_name=cache_name)
+        self.stale_timeout = stale_timeout
+        self.lock_timeout = lock_timeout
+        self.lock_wait = lock_wait
+        self.beta = beta
+        self._rebuilds = threading.local()
+
+    def get(self, key):
+        """
+        Gets a key from the cache. Returns ``None`` if the caller should
+        (re)build the value, in which case it holds the rebuild lock until
+        it calls ``set`` or ``release``.
+        """
+        entry = self.cache.get(key)
+
+        if entry is None:
+            if self._acquire(key):
+                return None
+
+            # Someone else is building it; give them a chance to finish.
+            deadline = time.time() + self.lock_wait
+
+            while entry is None and time.time() < deadline:
+                time.sleep(self.poll_interval)
+                entry = self.cache.get(key)
+
+            if entry is None:
+                self._start_rebuild(key)
+                return None
+
+            return entry['value']
+
+        if self._should_refresh(entry) and self._acquire(key):
+            return None
+
+        return entry['value']
+
+    def set(self, key, value, timeout=None):
+        """
+        Sets a key-value in the cache and releases the rebuild lock, if the
+        caller holds it.
+        """
+        if timeout is None:
+            timeout = self.timeout
+
+        now = time.time()
+        started, locked = self._get_rebuilds().pop(key, (now, False))
+        entry = {
+            'value': value,
+            'expires': now + timeout,
+            'delta': now - started,
+        }
+        self.cache.set(key, entry, timeout + self.stale_timeout)
+
+        # Only the holder may release the lock; another worker may hold it.
+        if locked:
+            self.cache.delete(self.get_lock_key(key))
+
+    def release(self, key):
+        """
+        Gives up rebuilding ``key`` without setting it, so other workers
+        don't wait for the rebuild lock to expire.
+        """
+        started, locked = self._get_rebuilds().pop(key, (None, False))
+
+        if locked:
+            self.cache.delete(self.get_lock_key(key))
+
+    def get_lock_key(self, key):
+        """
+        Returns the key of the rebuild lock of ``key``.
+        """
+        return '%s:lock' % key
+
+    def _should_refresh(self, entry):
+        """
+        Decides whether a cached entry should be rebuilt now.
+
+        Stale entries always are; fresh ones are with a probability that
+        grows as they approach expiry (the "XFetch" algorithm).
+        """
+        now = time.time()
+
+        if now >= entry['expires']:
+            return True
+
+        if not self.beta or not entry['delta']:
+            return False
+
+        return now - entry['delta'] * self.beta * math.log(1.0 - random.random()) >= entry['expires']
+
+    def _acquire(self, key):
+        """
+        Tries to take the rebuild lock of ``key``.
+        """
+        if self.cache.add(self.get_lock_key(key), 1, self.lock_timeout):
+            self._start_rebuild(key, locked=True)
+            return True
+
+        return False
+
+    def _start_rebuild(self, key, locked=False):
+        rebuilds = self._get_rebuilds()
+        now = time.time()
+
+        # Rebuilds that never reached ``set`` or ``release`` have long lost
+        # their lock; forget them.
+        for stale_key in [item for item, (started, held) in rebuilds.items() if started + self.lock_timeout < now]:
+            del rebuilds[stale_key]
+
+        # A rebuild restarted by the lock holder still holds the lock.
+        locked = locked or rebuilds.get(key, (now, False))[1]
+        rebuilds[key] = (now, locked)
+
+    def _get_rebuilds(self):
+        """
+        Returns the ``(start time, holds the lock)`` of the rebuilds made by
+        the current thread.
+        """
+        try:
+            return self._rebuilds.started
+        except AttributeError:
+            self._rebuilds.started = {}
+            return self._rebuilds.started
+
+
+# Tags (normalized model labels) whose versions are bumped by model signals.
+tracked_tags = set()
+
+# Tag versions have to outlive the entries depending on them.
+TAG_TIMEOUT = 60 * 60 * 24 * 30
+
+# Tag versions recently read by this process (see ``get_tag_versions``).
+local_tag_versions = LRUCache(max_entries=1024)
+
+
+def get_tag(tag):
+    """
+    Normalizes a cache tag. Models are turned into the lowercase
+    ``app_label.modelname`` label of their concrete model, any other tag
+    into a lowercase string.
+    """
+    if hasattr(tag, '_meta'):
+        # Proxy and deferred (``only``/``defer``) classes send the signals
+        # under their own name; they share the tag of the concrete model.
+        meta = (getattr(tag._meta, 'concrete_model', None) or tag)._meta
+        return '%s.%s' % (meta.app_label, meta.object_name.lower())
+
+    return str(tag).lower()
+
+
+def get_tag_key(tag):
+    return 'restumize:tag:%s' % tag
+
+
+def get_tag_versions(tags):
+    """
+    Returns the current version of each of the (normalized) ``tags``, in a
+    single round trip to the Django cache.
+
+    Tags without a version yet get one based on the current time, so a
+    counter evicted from the cache never brings back entries from before.
+
+    Versions are kept in this process for
+    ``settings.RESTUMIZE_TAG_VERSION_TIMEOUT`` seconds (default is 1, 0
+    disables it), so cached responses are served without a round trip. An
+    invalidation made by another process may go unnoticed for that long;
+    ``invalidate_tags`` is seen at once by the process calling it.
+    """
+    timeout = getattr(settings, 'RESTUMIZE_TAG_VERSION_TIMEOUT', 1)
+    keys = [get_tag_key(tag) for tag in tags]
+    versions = {}
+
+    if timeout:
+        for key in keys:
+            version = local_tag_versions.get(key)
+
+            if version is not None:
+                versions[key] = version
+
+    missing = [key for key in keys if key not in versions]
+
+    if missing:
+        versions.update(cache.get_many(missing))
+
+        for key in missing:
+            if key not in versions:
+                cache.add(key, int(time.time() * 1000), TAG_TIMEOUT)
+                versions[key] = cache.get(key)
+
+            if timeout:
+                local_tag_versions.set(key, versions[key], timeout=timeout)
+
+    return [versions[key] for key in keys]
+
+
+def invalidate_tags(*tags):
+    """
+    Invalidates every cached entry that depends on one of ``tags`` by
+    bumping their versions.
+    """
+    for tag in tags:
+        key = get_tag_key(get_tag(tag))
+        local_tag_versions.delete(key)
+
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, int(time.time() * 1000), TAG_TIMEOUT)
+
+
+def track_tags(tags):
+    """
+    Makes saving or deleting instances of the models in ``tags`` invalidate
+    the entries depending on them.
+    """
+    tracked_tags.update(tags)
+
+
+def invalidate_model(sender, **kwargs):
+    """
+    Signal handler bumping the version of the tag of a saved or deleted
+    model, if a resource depends on it.
+    """
+    tag = get_tag(sender)
+
+    if tag in tracked_tags:
+        invalidate_tags(tag)
+
+
+post_save.connect(invalidate_model, dispatch_uid='restumize.cache.invalidate_model')
+post_delete.connect(invalidate_model, dispatch_uid='restumize.cache.invalidate_model')
@@ -0,0 +1,239 @@
+"""
+Content codings for request bodies (``gzip``, ``deflate`` and, with the
+``brotli`` module, ``br``) and responses (``gzip`` and ``br``).
+"""
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Only the ``brotli`` module (1.1 or later) can bound the output of a call,
+# which decoding untrusted bodies requires.
+bounded_brotli = brotli is not None and hasattr(brotli.Decompressor, 'can_accept_more_data')
+
+from restumize.exceptions import BadRequest, RequestTooLarge
+from restumize.utils.lru import LRUCache
+
+
+# Clients only send a handful of distinct ``Accept-Encoding`` headers.
+negotiation_cache = LRUCache(max_entries=256)
+
+
+class ZlibDecoder(object):
+    """
+    Decodes ``gzip`` or ``deflate`` data. Raw deflate streams, which some
+    clients send as ``deflate``, are accepted too.
+    """
+    def __init__(self, wbits):
+        self.wbits = wbits
+        self.started = False
+        self.decoder = zlib.decompressobj(wbits)
+
+    def decompress(self, data, max_length):
+        if not self.started and self.wbits == zlib.MAX_WBITS:
+            self.started = True
+
+            try:
+                return self.decoder.decompress(data, max_length)
+            except zlib.error:
+                self.decoder = zlib.decompressobj(-zlib.MAX_WBITS)
+
+        self.started = True
+        return self.decoder.decompress(data, max_length)
+
+    @property
+    def unconsumed_tail(self):
+        return self.decoder.unconsumed_tail
+
+    def flush(self, max_length):
+        return self.decoder.flush()
+
+
+class BrotliDecoder(object):
+    """
+    Decodes ``br`` data with the ``brotli`` module, at most about
+    ``max_length`` bytes per call.
+    """
+    def __init__(self):
+        self.decoder = brotli.Decompressor()
+        self.unconsumed_tail = ''
+
+    def decompress(self, data, max_length):
+        # Output left over from the previous call has to be drained, with no
+        # input, before more input is accepted.
+        if self.decoder.can_accept_more_data():
+            self.unconsumed_tail = ''
+            return self.decoder.process(data, output_buffer_limit=max_length)
+
+        self.unconsumed_tail = data
+        return self.decoder.process('', output_buffer_limit=max_length)
+
+    def flush(self, max_length):
+        if self.decoder.is_finished():
+            return ''
+
+        data = self.decoder.process('', output_buffer_limit=max_length)
+
+        if not data and not self.decoder.is_finished():
+            raise ValueError('Truncated brotli data.')
+
+        return data
+
+
+def get_decoder(encoding):
+    """
+    Returns a decoder for the ``Content-Encoding`` ``encoding``, or ``None``
+    if it isn't supported.
+    """
+    if encoding in ('gzip', 'x-gzip'):
+        return ZlibDecoder(16 + zlib.MAX_WBITS)
+    elif encoding == 'deflate':
+        return ZlibDecoder(zlib.MAX_WBITS)
+    elif encoding == 'br' and bounded_brotli:
+        return BrotliDecoder()
+
+    return None
+
+
+class DecompressingStream(object):
+    """
+    Wraps the body stream of a request, decoding it as it is read.
+
+    Raises ``RequestTooLarge`` as soon as more than ``max_size`` bytes have
+    been decoded, which guards against decompression bombs; and
+    ``BadRequest`` if the body isn't validly encoded.
+    """
+    chunk_size = 64 * 1024
+
+    def __init__(self, stream, decoder, max_size):
+        self.stream = stream
+        self.decoder = decoder
+        self.max_size = max_size
+        self.size = 0
+        self.buffer = ''
+        self.pending = ''
+        self.eof = False
+
+    def read(self, size=-1):
+        while not self.eof and (size is None or size < 0 or len(self.buffer) < size):
+            self._decode()
+
+        if size is None or size < 0:
+            data, self.buffer = self.buffer, ''
+        else:
+            data, self.buffer = self.buffer[:size], self.buffer[size:]
+
+        return data
+
+    def readline(self, size=-1):
+        while not self.eof and '\n' not in self.buffer and (size is None or size < 0 or len(self.buffer) < size):
+            self._decode()
+
+        end = self.buffer.find('\n') + 1 or len(self.buffer)
+
+        if size is not None and size >= 0:
+            end = min(end, size)
+
+        data, self.buffer = self.buffer[:end], self.buffer[end:]
+        return data
+
+    def _decode(self):
+        """
+        Decodes the next piece of the body into the buffer.
+        """
+        if not self.pending:
+            self.pending = self.stream.read(self.chunk_size)
+
+        try:
+            if self.pending:
+                data = self.decoder.decompress(self.pending, self.chunk_size)
+                self.pending = self.decoder.unconsumed_tail
+            else:
+                # Flushed until nothing is left, a piece at a time.
+                data = self.decoder.flush(self.chunk_size)
+                self.eof = not data
+        except Exception:
+            raise BadRequest('The request body is not validly encoded.')
+
+        self.size += len(data)
+
+        if self.size > self.max_size:
+            raise RequestTooLarge('The decoded request body is larger than %d bytes.' % self.max_size)
+
+        self.buffer += data
+
+
+def get_encodings():
+    """
+    Returns the response encodings that can be produced, by preference.
+    """
+    if brotli is not None:
+        return ('br', 'gzip')
+
+    return ('gzip',)
+
+
+def negotiate_encoding(accept_encoding, encodings):
+    """
+    Picks the encoding of a response among ``encodings`` (by preference)
+    from an ``Accept-Encoding`` header. Returns ``None`` if the response
+    should not be encoded.
+    """
+    key = (accept_encoding, encodings)
+    encoding = negotiation_cache.get(key, False)
+
+    if encoding is False:
+        encoding = parse_accept_encoding(accept_encoding, encodings)
+        negotiation_cache.set(key, encoding)
+
+    return encoding
+
+
+def parse_accept_encoding(accept_encoding, encodings):
+    qualities = {}
+
+    for item in accept_encoding.split(','):
+        parts = item.split(';')
+        coding = parts[0].strip().lower()
+        quality = 1.0
+
+        for param in parts[1:]:
+            name, _, value = param.partition('=')
+
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+
+        if coding:
+            qualities[coding] = quality
+
+    best, best_quality = None, 0.0
+
+    for encoding in encodings:
+        if encoding == 'br' and brotli is None:
+            continue
+
+        quality = qualities.get(encoding, qualities.get('*', 0.0))
+
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+
+    return best
+
+
+def compress(content, encoding, level=6, brotli_quality=5):
+    """
+    Encodes ``content`` with ``gzip`` (at zlib ``level``) or ``br`` (at
+    ``brotli_quality``).
+    """
+    if encoding == 'br':
+        return brotli.compress(content, quality=brotli_quality)
+
+    # A zlib gzip stream has no timestamp, so identical content always
+    # compresses to identical bytes.
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(content) + compressor.flush()
@@ -0,0 +1,21 @@
+class RequestContext(object):
+    """
+    A lightweight container for the per-request state of a handler.
+
+    Carries the raw request data, the cleaned values, the validation errors
+    and the authentication results, so that a single handler instance can be
+    shared between requests (and threads) when ``Meta.reusable`` is set.
+    """
+    __slots__ = ('request', 'get_data', 'post_data', 'files', 'cleaned_data', 'errors', 'identifier')
+
+    def __init__(self, request=None, get_data=None, post_data=None, files=None):
+        self.request = request
+        self.get_data = get_data or {}
+        self.post_data = post_data or {}
+        self.files = files or {}
+        self.cleaned_data = {}
+        self.errors = {}
+        self.identifier = None
+
+    def __repr__(self):
+        return "<RequestContext with cleaned data: '%s' and errors: '%s'>" % (self.cleaned_data, self.errors)
@@ -1,5 +1,7 @@
 from django.http import HttpResponse
 
+from restumize import http
+
 
 class RestumizeError(Exception):
     """A base exception for other tastypie-related errors."""
@@ -44,9 +46,25 @@ class BadRequest(RestumizeError):
     A generalized exception for indicating incorrect request parameters.
 
     Handled specially in that the message tossed by this exception will be
-    presented to the end user.
+    presented to the end user, in a ``response_class`` response.
     """
-    pass
+    response_class = http.HttpBadRequest
+
+
+class RequestTooLarge(BadRequest):
+    """
+    Raised when the body of a request goes over one of the size limits of
+    the resource. Presented to the end user with a 413 status.
+    """
+    response_class = http.HttpRequestEntityTooLarge
+
+
+class UnsupportedMediaType(BadRequest):
+    """
+    Raised when the body of a request is sent in an encoding the resource
+    doesn't accept. Presented to the end user with a 415 status.
+    """
+    response_class = http.HttpUnsupportedMediaType
 
 
 class BlueberryFillingFound(RestumizeError):
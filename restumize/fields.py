@@ -115,6 +115,9 @@ class IntegerField(BaseField):
         Validates that int() can be called on the input. Returns the result
         of int(). Returns None for empty values.
         """
+        # Typed bodies (e.g. JSON) already hold integers.
+        if type(value) in (int, long):
+            return value
         value = super(IntegerField, self).to_python(value)
         if value in validators.EMPTY_VALUES:
             return self.default
@@ -137,6 +140,11 @@ class FloatField(IntegerField):
         Validates that float() can be called on the input. Returns the result
         of float(). Returns None for empty values.
         """
+        # Typed bodies (e.g. JSON) already hold numbers.
+        if type(value) is float:
+            return value
+        if type(value) in (int, long):
+            return float(value)
         value = super(IntegerField, self).to_python(value)
         if value in validators.EMPTY_VALUES:
             return self.default
@@ -1,25 +1,35 @@
 
-import copy
 import datetime
+import hashlib
 import logging
-import mimeparse
+from StringIO import StringIO
+from calendar import timegm
+from collections import Iterator, namedtuple
 
 import django
 from django.conf import settings
 from django.conf.urls.defaults import patterns, url
-from django.core.exceptions import ObjectDoesNotExist, MultipleObjectsReturned, ValidationError
+from django.core.exceptions import ImproperlyConfigured, ObjectDoesNotExist, MultipleObjectsReturned, ValidationError
 from django.forms.util import ErrorDict, ErrorList
-from django.http import HttpResponse, HttpResponseNotFound, Http404
-from django.utils.datastructures import SortedDict
+from django.http import HttpResponse, HttpResponseNotFound, Http404, QueryDict
+from django.utils.cache import patch_vary_headers
+from django.utils.datastructures import MultiValueDict, SortedDict
+from django.utils.encoding import smart_str
+from django.utils.http import http_date, parse_etags, parse_http_date_safe, quote_etag
 from django.views.decorators.csrf import csrf_exempt
 
 from restumize.fields import BaseField, FileField
 from restumize.serializers import Serializer
 from restumize.authentication import Authentication
 from restumize.authorization import ReadOnlyAuthorization
-from restumize.cache import NoCache
+from restumize.cache import NoCache, get_tag, get_tag_versions, track_tags
+from restumize.compression import DecompressingStream, compress, get_decoder, get_encodings, negotiate_encoding
+from restumize.context import RequestContext
 from restumize.throttle import BaseThrottle
-from restumize.exceptions import NotFound, BadRequest, ImmediateHttpResponse
+from restumize.uploadhandler import LimitedUploadHandler
+# ``build_content_type`` stays importable from here.
+from restumize.utils.mime import build_content_type, determine_format
+from restumize.exceptions import NotFound, BadRequest, ImmediateHttpResponse, RequestTooLarge, UnsupportedFormat, UnsupportedMediaType
 from restumize import http
 
 def get_declared_fields(bases, attrs, with_base_fields=True):
@@ -40,6 +50,29 @@ def get_declared_fields(bases, attrs, with_base_fields=True):
     return SortedDict(fields)
 
 
+# One precomputed step of a handler's clean plan. ``clean`` is the field's
+# bound ``clean`` method (which owns the field's defaults and validator
+# chain), ``hook`` is the handler's ``clean_<name>`` method or ``None`` and
+# ``is_file`` tells whether ``request.FILES`` is a raw-value source.
+CleanStep = namedtuple('CleanStep', ['name', 'field', 'clean', 'hook', 'is_file'])
+
+
+def build_clean_plan(handler_class):
+    """
+    Compiles the fields of ``handler_class`` into an immutable clean plan.
+
+    The plan is built once per class so that requests only have to run it,
+    without copying fields or looking up ``clean_<name>`` hooks.
+    """
+    plan = []
+
+    for name, field in handler_class.base_fields.items():
+        hook = getattr(handler_class, 'clean_%s' % name, None)
+        plan.append(CleanStep(name, field, field.clean, hook, isinstance(field, FileField)))
+
+    return tuple(plan)
+
+
 class ResourceOptions(object):
     """
     A configuration class for ``Resource``.
@@ -51,6 +84,9 @@ class ResourceOptions(object):
     authentication = Authentication()
     authorization = ReadOnlyAuthorization()
     cache = NoCache()
+    cache_timeout = None
+    cache_per_identifier = False
+    cache_tags = ()
     throttle = BaseThrottle()
     allowed_methods = ['get', 'post', 'put', 'delete', 'patch']
     limit = getattr(settings, 'API_LIMIT_PER_PAGE', 20)
@@ -59,6 +95,18 @@ class ResourceOptions(object):
     resource_name = None
     urlconf_namespace = None
     default_format = 'application/json'
+    reusable = False
+    trusted_output = False
+    max_body_size = None
+    max_fields = None
+    max_files = None
+    max_file_size = None
+    request_encodings = ()
+    max_decompression_ratio = 100
+    response_encodings = ()
+    compression_threshold = 1024
+    compression_level = 6
+    brotli_quality = 5
 
     def __new__(cls, meta=None):
         overrides = {}
@@ -80,6 +128,54 @@ class ResourceOptions(object):
 
         return object.__new__(type('ResourceOptions', (cls,), overrides))
 
+    def compile_dispatch(self, resource_class):
+        """
+        Precomputes the method dispatch table of ``resource_class``.
+
+        Maps each allowed (uppercase) HTTP method to the handler method that
+        serves it and prebuilds the ``Allow`` header, so dispatching a
+        request is a single dictionary lookup. ``HEAD`` is served by ``get``
+        unless the resource handles it explicitly.
+
+        Also looks up the optional ``get_etag`` and ``get_last_modified``
+        hooks used to answer conditional requests, whether responses are
+        cached at all and whether request sizes are limited.
+        """
+        self.allow_header = ','.join(method.upper() for method in self.allowed_methods)
+        self.dispatch_table = {}
+
+        for method in self.allowed_methods:
+            # ``OPTIONS`` is always answered with the prebuilt response.
+            if method != 'options' and hasattr(resource_class, method):
+                self.dispatch_table[method.upper()] = getattr(resource_class, method)
+
+        if 'GET' in self.dispatch_table and 'head' not in self.allowed_methods:
+            self.dispatch_table['HEAD'] = self.dispatch_table['GET']
+
+        self.etag_hook = getattr(resource_class, 'get_etag', None)
+        self.last_modified_hook = getattr(resource_class, 'get_last_modified', None)
+        self.cache_enabled = type(self.cache) is not NoCache
+        self.limits_enabled = any(limit is not None for limit in (self.max_body_size, self.max_fields, self.max_files, self.max_file_size))
+        self.response_encodings = tuple(encoding for encoding in self.response_encodings if encoding in get_encodings())
+        self.cache_tags = tuple(get_tag(tag) for tag in self.cache_tags)
+        track_tags(self.cache_tags)
+
+    def options_response(self):
+        """
+        Returns the response to an ``OPTIONS`` request.
+        """
+        response = HttpResponse(self.allow_header)
+        response['Allow'] = self.allow_header
+        return response
+
+    def method_not_allowed_response(self):
+        """
+        Returns the response to a request using a disallowed HTTP method.
+        """
+        response = http.HttpMethodNotAllowed(self.allow_header)
+        response['Allow'] = self.allow_header
+        return response
+
 
 class DeclarativeFieldsMetaclass(type):
     """
@@ -100,6 +196,9 @@ class DeclarativeFieldsMetaclass(type):
             resource_name = ''.join(name_bits).lower()
             new_class._meta.resource_name = resource_name
 
+        new_class._clean_plan = build_clean_plan(new_class)
+        new_class._meta.compile_dispatch(new_class)
+
         return new_class
 
 
@@ -109,50 +208,66 @@ class BaseHandler(object):
 
     def __init__(self, get_data=None, post_data=None, files=None, error_class=list):
         self.error_class = error_class
-        self.fields = copy.deepcopy(self.base_fields)
+        # Fields are never mutated while cleaning, so the class-level ones
+        # are shared instead of being deep-copied for every request.
+        self.fields = self.base_fields
         self.get_data = get_data or {}
         self.post_data = post_data or {}
         self.files = files or {}
 
-    def _get_raw_value(self, name):
-        value = self.get_data.get(name)
-        value = self.post_data.get(name, value)
-        value = self.files.get(name, value)
-
-        return value
+    def _is_valid(self, context=None):
+        if self._meta.reusable:
+            self._clean_fields(context)
+            return not context.errors
 
-    def _is_valid(self):
-        self._full_clean()
+        self._full_clean(context)
         return not bool(self._errors)
 
-    def _get_error_list(self):
+    def _get_error_list(self, context=None):
+        # Reusable handlers keep their errors on the context only.
+        errors = self._errors if context is None else context.errors
+
         error_list = []
-        for name, value in self._errors.iteritems():
+        for name, value in errors.iteritems():
             error_list.append((name,value))
 
         return error_list
 
-    def _full_clean(self):
-        self._cleaned_data = {}
-        self._errors = {}
-        self._clean_fields()
+    def _full_clean(self, context=None):
+        if context is None:
+            context = RequestContext(None, self.get_data, self.post_data, self.files)
+
+        self._cleaned_data = context.cleaned_data
+        self._errors = context.errors
+        self._clean_fields(context)
         self._replace_fields()
         if self._errors:
             del self._cleaned_data
 
-    def _clean_fields(self):
-        for name, field in self.fields.items():
-            value = self._get_raw_value(name)
+    def _clean_fields(self, context):
+        """
+        Runs the clean plan against the raw data of ``context``.
+
+        Reusable handlers get the context passed to their ``clean_<name>``
+        hooks, since they can't keep per-request state on ``self``.
+        """
+        get_data, post_data, files = context.get_data, context.post_data, context.files
+        cleaned_data = context.cleaned_data
+        hook_args = self._meta.reusable and (context,) or ()
+
+        for name, field, clean, hook, is_file in self._clean_plan:
+            value = post_data.get(name, get_data.get(name))
+            if is_file:
+                value = files.get(name, value)
+
             try:
-                value = field.clean(value)
-                self._cleaned_data[name] = value
-                if hasattr(self, 'clean_%s' % name):
-                    value = getattr(self, 'clean_%s' % name)()
-                    self._cleaned_data[name] = value
+                cleaned_data[name] = clean(value)
+                if hook is not None:
+                    cleaned_data[name] = hook(self, *hook_args)
             except ValidationError, e:
-                self._errors[name] = self.error_class(e.messages)
-                if name in self._cleaned_data:
-                    del self._cleaned_data[name]
+                context.errors[name] = self.error_class(e.messages)
+                if name in cleaned_data:
+                    del cleaned_data[name]
     
     def _replace_fields(self):
         """
@@ -180,7 +295,7 @@ class BaseHandler(object):
             }
             desired_format = self._determine_format(request)
             serialized = self._serialize(request, data, desired_format)
-            return response_class(content=serialized, content_type=build_content_type(desired_format))
+            return response_class(content=serialized, content_type=self._build_content_type(desired_format))
 
         # When DEBUG is False, send an error message to the admins (unless it's
         # a 404, in which case we check the setting).
@@ -205,7 +320,7 @@ class BaseHandler(object):
         }
         desired_format = self._determine_format(request)
         serialized = self._serialize(request, data, desired_format)
-        return response_class(content=serialized, content_type=build_content_type(desired_format))
+        return response_class(content=serialized, content_type=self._build_content_type(desired_format))
 
     def _clean(self):
         """
@@ -224,41 +339,367 @@ class BaseHandler(object):
         """
         return self._dispatch(request, **kwargs)
 
+    def _get_context(self, request):
+        """
+        Builds the ``RequestContext`` that carries the state of ``request``.
+
+        The body is parsed here, after authentication and throttling, by
+        ``get_request_body``. Reusable handlers read the query string straight
+        from the request, while per-request handlers use the data they were
+        instantiated with.
+        """
+        content, post_data, files = get_request_body(request, self._meta.serializer)
+
+        if self._meta.max_fields is not None and len(post_data) > self._meta.max_fields:
+            raise RequestTooLarge('A request can hold at most %d fields.' % self._meta.max_fields)
+
+        if self._meta.reusable:
+            return RequestContext(request, request.GET, post_data, files)
+
+        if post_data or files:
+            self.post_data, self.files = post_data, files
+
+        return RequestContext(request, self.get_data, self.post_data, self.files)
+
+    def _check_request_size(self, request):
+        """
+        Rejects requests over the ``Meta`` size limits before their body is
+        parsed, raising ``RequestTooLarge``.
+
+        ``max_body_size`` is checked against ``Content-Length`` and
+        ``max_fields`` by counting the pairs of urlencoded bodies. For
+        multipart bodies, ``max_files`` and ``max_file_size`` are enforced by
+        a ``LimitedUploadHandler`` while Django streams the upload.
+        """
+        meta = self._meta
+
+        # Batch entries come with their body already parsed.
+        if hasattr(request, '_restumize_body'):
+            return
+
+        if meta.max_body_size is not None:
+            try:
+                content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+            except ValueError:
+                content_length = 0
+
+            if content_length > meta.max_body_size:
+                raise RequestTooLarge('The request body is larger than %d bytes.' % meta.max_body_size)
+
+        if request.method not in BODY_METHODS:
+            return
+
+        mime = request.META.get('CONTENT_TYPE', '').split(';', 1)[0].strip().lower()
+
+        if mime == 'multipart/form-data':
+            if meta.max_files is not None or meta.max_file_size is not None:
+                request.upload_handlers.insert(0, LimitedUploadHandler(request, meta.max_files, meta.max_file_size))
+        elif mime == 'application/x-www-form-urlencoded' and meta.max_fields is not None and 'HTTP_CONTENT_ENCODING' not in request.META:
+            if request.body.count('&') + 1 > meta.max_fields:
+                raise RequestTooLarge('A request can hold at most %d fields.' % meta.max_fields)
+
+    def _decode_request(self, request):
+        """
+        Makes the body of a request sent with a ``Content-Encoding`` be
+        decoded as it is read, so it is parsed as usual.
+
+        Only the encodings listed in ``Meta.request_encodings`` (among
+        ``gzip``, ``deflate`` and ``br``) are accepted; others are rejected
+        with a 415. The decoded body may be at most
+        ``Meta.max_decompression_ratio`` times as large as the encoded one,
+        and at most ``Meta.max_body_size``.
+        """
+        encoding = request.META['HTTP_CONTENT_ENCODING'].strip().lower()
+
+        # Batch entries come with their body already parsed.
+        if encoding in ('', 'identity') or hasattr(request, '_restumize_body'):
+            return
+
+        decoder = None
+
+        if encoding in self._meta.request_encodings:
+            decoder = get_decoder(encoding)
+
+        if decoder is None:
+            raise UnsupportedMediaType("The '%s' content encoding is not supported." % encoding)
+
+        try:
+            content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            content_length = 0
+
+        max_size = content_length * self._meta.max_decompression_ratio
+
+        if self._meta.max_body_size is not None:
+            max_size = min(max_size, self._meta.max_body_size)
+
+        if hasattr(request, '_body'):
+            stream = StringIO(request._body)
+            del request._body
+            request._read_started = False
+        else:
+            stream = request._stream
+
+        for attribute in ('_post', '_files'):
+            if hasattr(request, attribute):
+                delattr(request, attribute)
+
+        request._stream = DecompressingStream(stream, decoder, max_size)
+        # Django sizes uploads after this header; the decoded body is at
+        # most that large.
+        request.META['CONTENT_LENGTH'] = str(max_size)
+        del request.META['HTTP_CONTENT_ENCODING']
+
     def _dispatch(self, request, **kwargs):
         """
         Handles the common operations (allowed HTTP method, authentication,
         throttling, method lookup) surrounding most CRUD interactions.
         """
-        allowed_methods = getattr(self._meta, "allowed_methods", None)
-        request_method = self._method_check(request, allowed=allowed_methods)
-        method = getattr(self, request_method, None)
+        method = self._meta.dispatch_table.get(request.method)
+
+        if method is None:
+            if request.method == 'OPTIONS':
+                raise ImmediateHttpResponse(response=self._meta.options_response())
+
+            raise ImmediateHttpResponse(response=self._meta.method_not_allowed_response())
+
+        if self._meta.limits_enabled:
+            self._check_request_size(request)
+
+        if 'HTTP_CONTENT_ENCODING' in request.META:
+            self._decode_request(request)
+
+        # Batch entries arrive already authenticated by the batch itself.
+        identifier = getattr(request, '_restumize_identifier', None)
+
+        if identifier is None:
+            self._is_authenticated(request)
+            identifier = self._meta.authentication.get_identifier(request)
 
-        self._is_authenticated(request)
         self._is_authorized(request)
-        self._throttle_check(request)
+        self._throttle_check(request, identifier)
 
         # All clear. Process the request.
-        request = convert_post_to_put(request)
-        if self._is_valid():
-            response = method(request, **kwargs)
-        else:
+        context = self._get_context(request)
+        context.identifier = identifier
+
+        if not self._is_valid(context):
             return http.HttpBadRequest()
 
-        # Add the throttled request.
-        self._log_throttled_access(request)
+        etag, last_modified = None, None
 
-        # If what comes back isn't a ``HttpResponse``, assume that the
-        # request was accepted and that some action occurred. This also
-        # prevents Django from freaking out.
-        if isinstance(response, HttpResponse):
-            return response
+        if request.method in ('GET', 'HEAD'):
+            etag, last_modified = self._get_validators(request, context)
 
-        if response is None:
-            return http.HttpNoContent()
+            if self._is_not_modified(request, etag, last_modified):
+                self._log_throttled_access(request, identifier)
+                return self._set_validators(http.HttpNotModified(), etag, last_modified)
 
         desired_format = self._determine_format(request)
-        data = self._serialize(request, response, desired_format)
-        response = HttpResponse(data, content_type=build_content_type(desired_format))
+        cache_key = None
+
+        if request.method == 'GET' and self._meta.cache_enabled:
+            cache_key = self._get_cache_key(request, context, desired_format, **kwargs)
+            cached = self._meta.cache.get(cache_key)
+
+            if cached is not None:
+                self._log_throttled_access(request, identifier)
+                response = HttpResponse(cached['content'], content_type=cached['content_type'])
+                response = self._set_validators(response, etag, last_modified)
+                return self._compress_response(request, response, cached.get('encoded'))
+
+        try:
+            if self._meta.reusable:
+                response = method(self, request, context=context, **kwargs)
+            else:
+                response = method(self, request, **kwargs)
+
+            # Add the throttled request.
+            self._log_throttled_access(request, identifier)
+
+            # If what comes back isn't a ``HttpResponse``, assume that the
+            # request was accepted and that some action occurred. This also
+            # prevents Django from freaking out.
+            if isinstance(response, HttpResponse):
+                return response
+
+            if response is None:
+                return http.HttpNoContent()
+
+            if request.method == 'HEAD':
+                # Nothing would be sent, so don't bother serializing the body.
+                response = HttpResponse(content_type=self._build_content_type(desired_format))
+            elif isinstance(response, Iterator):
+                # Generators and other iterators are encoded item by item, so
+                # the size of the result doesn't matter.
+                data = self._serialize_stream(request, response, desired_format)
+                response = http.StreamingHttpResponse(data, content_type=self._build_content_type(desired_format))
+            else:
+                data = self._serialize(request, response, desired_format)
+                response = HttpResponse(data, content_type=self._build_content_type(desired_format))
+                encoded = None
+
+                if cache_key is not None:
+                    # Hits are served in any encoding without compressing again.
+                    encoded = self._encode_content(response.content)
+                    self._meta.cache.set(cache_key, {
+                        'content': response.content,
+                        'content_type': response['Content-Type'],
+                        'encoded': encoded,
+                    }, self._meta.cache_timeout)
+                    # Stored, so there is nothing to release.
+                    cache_key = None
+
+                response = self._set_validators(response, etag, last_modified)
+                return self._compress_response(request, response, encoded)
+
+            return self._set_validators(response, etag, last_modified)
+        finally:
+            if cache_key is not None:
+                # The miss won't be cached (the handler failed or returned
+                # something else), so another worker may build it.
+                self._meta.cache.release(cache_key)
+
+    def _encode_content(self, content):
+        """
+        Compresses serialized ``content`` in each of the
+        ``Meta.response_encodings``, for a cache entry.
+
+        Returns a dictionary of encoding -> compressed content, empty if the
+        content is under ``Meta.compression_threshold``.
+        """
+        meta = self._meta
+
+        if len(content) < meta.compression_threshold:
+            return {}
+
+        return dict((encoding, compress(content, encoding, meta.compression_level, meta.brotli_quality)) for encoding in meta.response_encodings)
+
+    def _compress_response(self, request, response, encoded=None):
+        """
+        Compresses a serialized response in the best of the
+        ``Meta.response_encodings`` the client accepts, unless it is smaller
+        than ``Meta.compression_threshold``.
+
+        ``encoded`` holds the content already compressed in some encodings
+        (from the cache); it is never modified.
+        """
+        meta = self._meta
+
+        if not meta.response_encodings:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = negotiate_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''), meta.response_encodings)
+
+        if encoding is None:
+            return response
+
+        if encoded and encoding in encoded:
+            content = encoded[encoding]
+        elif len(response.content) >= meta.compression_threshold:
+            content = compress(response.content, encoding, meta.compression_level, meta.brotli_quality)
+        else:
+            return response
+
+        response.content = content
+        response['Content-Encoding'] = encoding
+        response['Content-Length'] = str(len(content))
+
+        # The compressed bytes differ from the identity ones, so a strong
+        # validator no longer applies.
+        if response.has_header('ETag') and not response['ETag'].startswith('W/'):
+            response['ETag'] = 'W/%s' % response['ETag']
+
+        return response
+
+    def _get_cache_key(self, request, context, format, **kwargs):
+        """
+        Builds the key under which the serialized response to ``request`` is
+        cached.
+
+        The key covers the api and the resource, the arguments captured from
+        the URL, the negotiated format (and JSONP callback), the cleaned data
+        and, when ``Meta.cache_per_identifier`` is set, the identifier of the
+        requestor.
+
+        It also covers the current versions of ``Meta.cache_tags`` (models or
+        arbitrary tags), so bumping one of them (see
+        ``restumize.cache.invalidate_tags``, called when a tagged model is
+        saved or deleted) invalidates every entry depending on it. Those
+        versions are briefly kept in the process (see
+        ``restumize.cache.get_tag_versions``), so hits don't cost a round
+        trip to the cache for them.
+        """
+        # URL captures are strings; other arguments (such as the ``Api``)
+        # don't belong in a key.
+        captured = sorted((key, value) for (key, value) in kwargs.items() if isinstance(value, basestring) and key != 'api_name')
+        bits = [
+            repr(captured),
+            format,
+            request.GET.get('callback', ''),
+            repr(sorted(context.cleaned_data.items())),
+        ]
+
+        if self._meta.cache_per_identifier:
+            bits.append(context.identifier)
+
+        if self._meta.cache_tags:
+            bits.append(repr(get_tag_versions(self._meta.cache_tags)))
+
+        digest = hashlib.md5(smart_str('\n'.join(bits))).hexdigest()
+        return 'restumize:%s:%s:%s' % (kwargs.get('api_name'), self._meta.resource_name, digest)
+
+    def _get_validators(self, request, context):
+        """
+        Calls the optional ``get_etag(request, cleaned_data)`` and
+        ``get_last_modified(request, cleaned_data)`` hooks of the handler.
+
+        Returns the entity tag (a string) and the last modification time (a
+        UTC timestamp) of the response, or ``None`` for the hooks that are
+        not defined or have no answer.
+        """
+        etag, last_modified = None, None
+
+        if self._meta.etag_hook is not None:
+            etag = self._meta.etag_hook(self, request, context.cleaned_data)
+
+        if self._meta.last_modified_hook is not None:
+            last_modified = self._meta.last_modified_hook(self, request, context.cleaned_data)
+
+            if last_modified is not None:
+                last_modified = timegm(last_modified.utctimetuple())
+
+        return etag, last_modified
+
+    def _is_not_modified(self, request, etag, last_modified):
+        """
+        Checks the ``If-None-Match`` and ``If-Modified-Since`` headers of the
+        request against the validators of the response.
+        """
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+
+        if if_none_match and etag is not None:
+            etags = parse_etags(if_none_match)
+            return etag in etags or '*' in etags
+
+        if_modified_since = request.META.get('HTTP_IF_MODIFIED_SINCE')
+
+        if if_modified_since and last_modified is not None:
+            if_modified_since = parse_http_date_safe(if_modified_since)
+            return if_modified_since is not None and last_modified <= if_modified_since
+
+        return False
+
+    def _set_validators(self, response, etag, last_modified):
+        """
+        Adds the ``ETag`` and ``Last-Modified`` headers to the response.
+        """
+        if etag is not None and not response.has_header('ETag'):
+            response['ETag'] = quote_etag(etag)
+
+        if last_modified is not None and not response.has_header('Last-Modified'):
+            response['Last-Modified'] = http_date(last_modified)
 
         return response
 
@@ -330,36 +771,37 @@ class BaseHandler(object):
         if not auth_result is True:
             raise ImmediateHttpResponse(response=http.HttpUnauthorized())
 
-    def _throttle_check(self, request):
+    def _throttle_check(self, request, identifier=None):
         """
         Handles checking if the user should be throttled.
 
         Mostly a hook, this uses class assigned to ``throttle`` from
         ``Resource._meta``.
         """
-        identifier = self._meta.authentication.get_identifier(request)
+        if identifier is None:
+            identifier = self._meta.authentication.get_identifier(request)
 
         # Check to see if they should be throttled.
         if self._meta.throttle.should_be_throttled(identifier):
             # Throttle limit exceeded.
             raise ImmediateHttpResponse(response=http.HttpTooManyRequests())
 
-    def _log_throttled_access(self, request):
+    def _log_throttled_access(self, request, identifier=None):
         """
         Handles the recording of the user's access for throttling purposes.
 
         Mostly a hook, this uses class assigned to ``throttle`` from
         ``Resource._meta``.
         """
+        if identifier is None:
+            identifier = self._meta.authentication.get_identifier(request)
+
         request_method = request.method.lower()
-        self._meta.throttle.accessed(self._meta.authentication.get_identifier(request), url=request.get_full_path(), request_method=request_method)
+        self._meta.throttle.accessed(identifier, url=request.get_full_path(), request_method=request_method)
     
-    def _serialize(self, request, data, format, options=None):
+    def _get_serialization_options(self, request, format, options=None):
         """
-        Given a request, data and a desired format, produces a serialized
-        version suitable for transfer over the wire.
-
-        Mostly a hook, this uses the ``Serializer`` from ``Resource._meta``.
+        Builds the options handed to the ``Serializer`` for ``request``.
         """
         options = options or {}
 
@@ -367,22 +809,66 @@ class BaseHandler(object):
             # get JSONP callback name. default to "callback"
             callback = request.GET.get('callback', 'callback')
 
-            if not is_valid_jsonp_callback_value(callback):
+            if not self._meta.serializer.is_valid_callback(callback):
                 raise BadRequest('JSONP callback name is invalid.')
 
             options['callback'] = callback
 
+        if self._meta.trusted_output:
+            # The handler only returns native types; skip ``to_simple``.
+            options['trusted'] = True
+
+        return options
+
+    def _serialize(self, request, data, format, options=None):
+        """
+        Given a request, data and a desired format, produces a serialized
+        version suitable for transfer over the wire.
+
+        Mostly a hook, this uses the ``Serializer`` from ``Resource._meta``.
+        """
+        options = self._get_serialization_options(request, format, options)
         return self._meta.serializer.serialize(data, format, options)
-    
+
+    def _serialize_stream(self, request, data, format, options=None):
+        """
+        Given a request, an iterable and a desired format, returns an
+        iterator over the serialized output, suitable for a streaming
+        response.
+
+        Mostly a hook, this uses the ``Serializer`` from ``Resource._meta``.
+        """
+        options = self._get_serialization_options(request, format, options)
+        return self._meta.serializer.serialize_stream(data, format, options)
+
+    def _deserialize_stream(self, request, format=None):
+        """
+        Given a request, returns an iterator over the items of the
+        ``objects`` list of its body, read and deserialized one at a time.
+        Useful for bulk imports that shouldn't hold the whole body in memory.
+
+        Mostly a hook, this uses the ``Serializer`` from ``Resource._meta``.
+        """
+        format = format or request.META.get('CONTENT_TYPE', 'application/json')
+        return self._meta.serializer.deserialize_stream(request, format)
+
     def _determine_format(self, request):
         """
         Used to determine the desired format.
 
-        Largely relies on ``tastypie.utils.mime.determine_format`` but here
+        Largely relies on ``restumize.utils.mime.determine_format`` but here
         as a point of extension.
         """
         return determine_format(request, self._meta.serializer, default_format=self._meta.default_format)
 
+    def _build_content_type(self, format):
+        """
+        Builds the ``Content-Type`` header of a response in ``format``.
+
+        Mostly a hook, this uses the ``Serializer`` from ``Resource._meta``.
+        """
+        return self._meta.serializer.get_content_type(format)
+
     def get(self, request, **kwargs):
         raise ImmediateHttpResponse(response=http.HttpMethodNotAllowed())
     
@@ -399,13 +885,65 @@ class BaseHandler(object):
         raise ImmediateHttpResponse(response=http.HttpMethodNotAllowed())
 
 
+# Methods whose body is parsed into the handler fields.
+BODY_METHODS = ('POST', 'PUT', 'PATCH')
+
+# Bodies parsed by Django rather than by the ``Serializer``.
+FORM_CONTENT_TYPES = ('application/x-www-form-urlencoded', 'multipart/form-data')
+
+
+def get_request_body(request, serializer):
+    """
+    Parses the body of ``request`` according to its ``Content-Type``, once
+    per request, and returns a ``(content, data, files)`` tuple.
+
+    Form bodies (and bodies of an unknown type) go through Django, including
+    for ``PUT`` and ``PATCH``; ``content`` is then ``None``. Any other format
+    the ``serializer`` knows is deserialized into ``content``, and ``data``
+    is that content if it is a hash, for the handler fields to read typed
+    values from. Raises ``BadRequest`` if the body can't be deserialized.
+    """
+    try:
+        return request._restumize_body
+    except AttributeError:
+        pass
+
+    content_type = request.META.get('CONTENT_TYPE', '')
+    mime = content_type.split(';', 1)[0].strip().lower()
+
+    if request.method not in BODY_METHODS:
+        body = (None, QueryDict(''), MultiValueDict())
+    elif mime in FORM_CONTENT_TYPES or mime not in serializer.supported_formats:
+        if request.method != 'POST':
+            convert_post_to_VERB(request, request.method)
+
+        body = (None, request.POST, request.FILES)
+    else:
+        try:
+            content = serializer.deserialize(request.body, format=content_type)
+        except UnsupportedFormat:
+            raise BadRequest("The '%s' format can't be used for request bodies." % mime)
+        except (BadRequest, ImproperlyConfigured):
+            raise
+        except Exception:
+            raise BadRequest('The request body is not valid %s.' % mime)
+
+        if isinstance(content, dict):
+            body = (content, content, MultiValueDict())
+        else:
+            body = (content, QueryDict(''), MultiValueDict())
+
+    request._restumize_body = body
+    return body
+
+
 # Based off of ``piston.utils.coerce_put_post``. Similarly BSD-licensed.
 # And no, the irony is not lost on me.
 def convert_post_to_VERB(request, verb):
     """
     Force Django to process the VERB.
     """
-    if request.method == verb:
+    if request.method == verb and not hasattr(request, verb):
         if hasattr(request, '_post'):
             del(request._post)
             del(request._files)
@@ -429,51 +967,3 @@ def convert_post_to_put(request):
 
 def convert_post_to_patch(request):
     return convert_post_to_VERB(request, verb='PATCH')
-
-
-def determine_format(request, serializer, default_format='application/json'):
-    """
-    Tries to "smartly" determine which output format is desired.
-    
-    First attempts to find a ``format`` override from the request and supplies
-    that if found.
-    
-    If no request format was demanded, it falls back to ``mimeparse`` and the
-    ``Accepts`` header, allowing specification that way.
-    
-    If still no format is found, returns the ``default_format`` (which defaults
-    to ``application/json`` if not provided).
-    """
-    # First, check if they forced the format.
-    if request.GET.get('format'):
-        if request.GET['format'] in serializer.formats:
-            return serializer.get_mime_for_format(request.GET['format'])
-    
-    # If callback parameter is present, use JSONP.
-    if request.GET.has_key('callback'):
-        return serializer.get_mime_for_format('jsonp')
-    
-    # Try to fallback on the Accepts header.
-    if request.META.get('HTTP_ACCEPT', '*/*') != '*/*':
-        formats = list(serializer.supported_formats) or []
-        # Reverse the list, because mimeparse is weird like that. See also
-        # https://github.com/toastdriven/django-tastypie/issues#issue/12 for
-        # more information.
-        formats.reverse()
-        best_format = mimeparse.best_match(formats, request.META['HTTP_ACCEPT'])
-        
-        if best_format:
-            return best_format
-    
-    # No valid 'Accept' header/formats. Sane default.
-    return default_format
-
-
-def build_content_type(format, encoding='utf-8'):
-    """
-    Appends character encoding to the provided format if not already present.
-    """
-    if 'charset' in format:
-        return format
-    
-    return "%s; charset=%s" % (format, encoding)
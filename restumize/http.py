@@ -3,6 +3,12 @@ The various HTTP responses for use in returning proper HTTP codes.
 """
 from django.http import HttpResponse
 
+try:
+    from django.http import StreamingHttpResponse
+except ImportError:
+    # Before Django 1.5, any ``HttpResponse`` built from an iterator streams.
+    StreamingHttpResponse = HttpResponse
+
 
 class HttpCreated(HttpResponse):
     status_code = 201
@@ -66,6 +72,14 @@ class HttpGone(HttpResponse):
     status_code = 410
 
 
+class HttpRequestEntityTooLarge(HttpResponse):
+    status_code = 413
+
+
+class HttpUnsupportedMediaType(HttpResponse):
+    status_code = 415
+
+
 class HttpTooManyRequests(HttpResponse):
     status_code = 429
 
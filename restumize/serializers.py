@@ -1,17 +1,25 @@
+import calendar
 import datetime
+import decimal
+import itertools
+import json
+import mimeparse
+import struct
 from StringIO import StringIO
 from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured
-from django.core.serializers import json
-from django.utils import simplejson
 from django.utils.encoding import force_unicode
 from restumize.bundle import Bundle
-from restumize.exceptions import UnsupportedFormat
+from restumize.exceptions import BadRequest, RequestTooLarge, UnsupportedFormat
 from restumize.utils import format_datetime, format_date, format_time, make_naive
+from restumize.utils import format_datetimes, format_iso_datetimes
+from restumize.utils import LRUCache, is_valid_jsonp_callback_value, to_aware, utc
+from restumize.utils.json_backends import get_json_backend
+from restumize.utils.mime import build_content_type
 try:
     import lxml
     from lxml.etree import parse as parse_xml
-    from lxml.etree import Element, tostring
+    from lxml.etree import Element, XMLParser, iterparse, tostring, xmlfile
 except ImportError:
     lxml = None
 try:
@@ -23,6 +31,14 @@ try:
     import biplist
 except ImportError:
     biplist = None
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
 
 
 # Ugh & blah.
@@ -30,7 +46,9 @@ except ImportError:
 # serialize advanced types. *HOWEVER*, it will dump out Python Unicode strings
 # as a custom YAML tag, which of course ``yaml.safe_load`` can't handle.
 if yaml is not None:
+    from yaml.composer import ComposerError
     from yaml.constructor import SafeConstructor
+    from yaml.events import AliasEvent
     from yaml.loader import Reader, Scanner, Parser, Composer, Resolver
 
     class RestumizeConstructor(SafeConstructor):
@@ -52,6 +70,14 @@ if yaml is not None:
             RestumizeConstructor.__init__(self)
             Resolver.__init__(self)
 
+        def compose_node(self, parent, index):
+            # Aliases let a tiny document expand into a huge one ("billion
+            # laughs"), so they are refused.
+            if self.check_event(AliasEvent):
+                raise ComposerError(None, None, "aliases are not allowed", self.peek_event().start_mark)
+
+            return Composer.compose_node(self, parent, index)
+
 
 class Serializer(object):
     """
@@ -61,28 +87,51 @@ class Serializer(object):
 
         * json
         * jsonp
+        * ndjson (one JSON record per line, see http://ndjson.org/)
         * xml
         * yaml
         * html
         * plist (see http://explorapp.com/biplist/)
+        * msgpack (see http://msgpack.org/)
+        * cbor (see http://cbor.io/)
+
+    The JSON engine is picked with ``settings.RESTUMIZE_JSON_BACKEND`` or the
+    ``json_backend`` argument (see ``restumize.utils.json_backends``) and key
+    sorting can be turned off with ``sort_keys=False``, which lets the
+    standard library encode with its C encoder.
 
     It was designed to make changing behavior easy, either by overridding the
     various format methods (i.e. ``to_json``), by changing the
     ``formats/content_types`` options or by altering the other hook methods.
+
+    Formats that can be written incrementally also provide a
+    ``stream_<format>`` method, used by ``serialize_stream`` to encode
+    iterators item by item.
     """
-    formats = ['json', 'jsonp', 'xml', 'yaml', 'html', 'plist']
+    formats = ['json', 'jsonp', 'ndjson', 'xml', 'yaml', 'html', 'plist', 'msgpack', 'cbor']
     content_types = {
         'json': 'application/json',
         'jsonp': 'text/javascript',
+        'ndjson': 'application/x-ndjson',
         'xml': 'application/xml',
         'yaml': 'text/yaml',
         'html': 'text/html',
         'plist': 'application/x-plist',
+        'msgpack': 'application/x-msgpack',
+        'cbor': 'application/cbor',
     }
-
-    def __init__(self, formats=None, content_types=None, datetime_formatting=None):
+    stream_chunk_size = 65536
+    negotiation_cache_size = 256
+    read_chunk_size = 65536
+    max_read_size = 10 * 1024 * 1024
+    max_read_depth = 32
+    max_read_elements = 100000
+
+    def __init__(self, formats=None, content_types=None, datetime_formatting=None, json_backend=None, sort_keys=True):
         self.supported_formats = []
         self.datetime_formatting = getattr(settings, 'RESTUMIZE_DATETIME_FORMATTING', 'iso-8601')
+        self.json_backend = getattr(settings, 'RESTUMIZE_JSON_BACKEND', 'simplejson')
+        self.sort_keys = sort_keys
 
         if formats is not None:
             self.formats = formats
@@ -93,12 +142,59 @@ class Serializer(object):
         if datetime_formatting is not None:
             self.datetime_formatting = datetime_formatting
 
+        if json_backend is not None:
+            self.json_backend = json_backend
+
+        self.json = get_json_backend(self.json_backend)
+
+        # Unless ``to_simple`` is customized, JSON is encoded in one pass
+        # straight from the handler output (see ``json_default``).
+        self.fused_json = self.to_simple.im_func is Serializer.to_simple.im_func
+
+        # Exact type -> simplifier, checked by ``to_simple`` before falling
+        # back on ``isinstance`` checks. See ``register_type``.
+        self.simplifiers = {
+            list: self.simplify_list,
+            tuple: self.simplify_list,
+            dict: self.simplify_dict,
+            Bundle: self.simplify_bundle,
+            datetime.datetime: lambda data, options: self.format_datetime(data),
+            datetime.date: lambda data, options: self.format_date(data),
+            datetime.time: lambda data, options: self.format_time(data),
+            unicode: lambda data, options: data,
+            str: lambda data, options: force_unicode(data),
+            bool: lambda data, options: data,
+            int: lambda data, options: data,
+            long: lambda data, options: data,
+            float: lambda data, options: data,
+            type(None): lambda data, options: data,
+        }
+
         for format in self.formats:
             try:
                 self.supported_formats.append(self.content_types[format])
             except KeyError:
                 raise ImproperlyConfigured("Content type for specified type '%s' not found. Please provide it at either the class level or via the arguments." % format)
 
+        # Map every MIME type to its (de)serialization methods once, so a
+        # lookup is a single dictionary access.
+        self._serializers = {}
+        self._deserializers = {}
+        self._streamers = {}
+        self._readers = {}
+
+        for short_format, long_format in self.content_types.items():
+            for table, prefix in ((self._serializers, 'to'), (self._deserializers, 'from'), (self._streamers, 'stream'), (self._readers, 'read')):
+                method = getattr(self, '%s_%s' % (prefix, short_format), None)
+
+                if method is not None:
+                    table[long_format] = method
+
+        # Clients only send a handful of distinct ``Accept`` headers and
+        # callback names, so the negotiation results are memoized.
+        self._accept_cache = LRUCache(max_entries=self.negotiation_cache_size)
+        self._callback_cache = LRUCache(max_entries=self.negotiation_cache_size)
+
     def get_mime_for_format(self, format):
         """
         Given a format, attempts to determine the correct MIME type.
@@ -111,6 +207,42 @@ class Serializer(object):
         except KeyError:
             return 'application/json'
 
+    def get_mime_for_accept(self, accept):
+        """
+        Given the value of an ``Accept`` header, returns the best matching
+        supported MIME type, or an empty string if none matches.
+        """
+        best_format = self._accept_cache.get(accept)
+
+        if best_format is None:
+            # Reverse the list, because mimeparse is weird like that. See also
+            # https://github.com/toastdriven/django-tastypie/issues#issue/12 for
+            # more information.
+            formats = list(reversed(self.supported_formats))
+            best_format = mimeparse.best_match(formats, accept) or ''
+            self._accept_cache.set(accept, best_format)
+
+        return best_format
+
+    def is_valid_callback(self, callback):
+        """
+        Returns whether ``callback`` may be used as a JSONP callback name.
+        """
+        is_valid = self._callback_cache.get(callback)
+
+        if is_valid is None:
+            is_valid = is_valid_jsonp_callback_value(callback)
+            self._callback_cache.set(callback, is_valid)
+
+        return is_valid
+
+    def get_content_type(self, format, encoding='utf-8'):
+        """
+        Returns the ``Content-Type`` header for a MIME type, appending the
+        character encoding if not already present.
+        """
+        return build_content_type(format, encoding)
+
     def format_datetime(self, data):
         """
         A hook to control how datetimes are formatted.
@@ -120,11 +252,26 @@ class Serializer(object):
 
         Default is ``iso-8601``, which looks like "2010-12-16T03:02:14".
         """
-        data = make_naive(data)
         if self.datetime_formatting == 'rfc-2822':
             return format_datetime(data)
 
-        return data.isoformat()
+        return make_naive(data).isoformat()
+
+    def format_datetimes(self, values):
+        """
+        Formats a whole column of datetimes at once, like ``format_datetime``
+        would one by one. ``None`` values are kept.
+
+        Used as is, this skips the per-value method calls and settings
+        lookups, which adds up for time series.
+        """
+        if self.format_datetime.im_func is not Serializer.format_datetime.im_func:
+            return [value is not None and self.format_datetime(value) or None for value in values]
+
+        if self.datetime_formatting == 'rfc-2822':
+            return format_datetimes(values)
+
+        return format_iso_datetimes(values)
 
     def format_date(self, data):
         """
@@ -154,45 +301,140 @@ class Serializer(object):
 
         return data.isoformat()
 
+    def get_format_method(self, table, format):
+        """
+        Looks up the method handling the MIME type ``format`` in one of the
+        dispatch tables, ignoring parameters such as ``; charset=utf-8``.
+
+        Returns ``None`` if the format is not supported.
+        """
+        method = table.get(format)
+
+        if method is None and ';' in format:
+            method = table.get(format.split(';', 1)[0].strip())
+
+        return method
+
     def serialize(self, bundle, format='application/json', options={}):
         """
         Given some data and a format, calls the correct method to serialize
         the data and returns the result.
         """
-        desired_format = None
+        method = self.get_format_method(self._serializers, format)
 
-        for short_format, long_format in self.content_types.items():
-            if format == long_format:
-                if hasattr(self, "to_%s" % short_format):
-                    desired_format = short_format
-                    break
+        if method is None:
+            raise UnsupportedFormat("The format indicated '%s' had no available serialization method. Please check your ``formats`` and ``content_types`` on your Serializer." % format)
+
+        return method(bundle, options)
+
+    def serialize_stream(self, data, format='application/json', options=None):
+        """
+        Given an iterable and a format, serializes the items incrementally and
+        yields the output in chunks of about ``stream_chunk_size`` characters.
 
-        if desired_format is None:
+        Formats without a ``stream_<format>`` method have their items
+        collected into a list and serialized in one go.
+        """
+        options = options or {}
+        method = self.get_format_method(self._serializers, format)
+
+        if method is None:
             raise UnsupportedFormat("The format indicated '%s' had no available serialization method. Please check your ``formats`` and ``content_types`` on your Serializer." % format)
 
-        serialized = getattr(self, "to_%s" % desired_format)(bundle, options)
-        return serialized
+        stream = self.get_format_method(self._streamers, format)
+
+        if stream is None:
+            yield method(list(data), options)
+            return
+
+        buffered = []
+        buffered_size = 0
+
+        for chunk in stream(data, options):
+            buffered.append(chunk)
+            buffered_size += len(chunk)
+
+            if buffered_size >= self.stream_chunk_size:
+                yield ''.join(buffered)
+                buffered = []
+                buffered_size = 0
+
+        if buffered:
+            yield ''.join(buffered)
 
     def deserialize(self, content, format='application/json'):
         """
         Given some data and a format, calls the correct method to deserialize
         the data and returns the result.
         """
-        desired_format = None
+        method = self.get_format_method(self._deserializers, format)
 
-        format = format.split(';')[0]
+        if method is None:
+            raise UnsupportedFormat("The format indicated '%s' had no available deserialization method. Please check your ``formats`` and ``content_types`` on your Serializer." % format.split(';')[0])
 
-        for short_format, long_format in self.content_types.items():
-            if format == long_format:
-                if hasattr(self, "from_%s" % short_format):
-                    desired_format = short_format
-                    break
+        return method(content)
+
+    def deserialize_stream(self, content, format='application/json'):
+        """
+        Given a string or a file-like object (such as the request) and a
+        format, yields the items of the top-level ``objects`` list (or of a
+        top-level list) one at a time. Any other document is yielded as a
+        single item.
+
+        Formats with a ``read_<format>`` method are parsed incrementally
+        while enforcing ``max_read_size``, ``max_read_depth`` and
+        ``max_read_elements``; the others are deserialized in one go. Raises
+        ``BadRequest`` if the content is invalid or over a limit.
+        """
+        method = self.get_format_method(self._deserializers, format)
+
+        if method is None:
+            raise UnsupportedFormat("The format indicated '%s' had no available deserialization method. Please check your ``formats`` and ``content_types`` on your Serializer." % format.split(';')[0])
+
+        reader = self.get_format_method(self._readers, format)
+
+        if isinstance(content, basestring):
+            content = StringIO(content)
 
-        if desired_format is None:
-            raise UnsupportedFormat("The format indicated '%s' had no available deserialization method. Please check your ``formats`` and ``content_types`` on your Serializer." % format)
+        content = LimitedReader(content, self.max_read_size)
 
-        deserialized = getattr(self, "from_%s" % desired_format)(content)
-        return deserialized
+        if reader is not None:
+            for item in reader(content):
+                yield item
+            return
+
+        data = method(content.read())
+
+        if isinstance(data, dict) and isinstance(data.get('objects'), list):
+            data = data['objects']
+
+        if isinstance(data, list):
+            for item in data:
+                yield item
+        else:
+            yield data
+
+    def register_type(self, data_type, simplifier):
+        """
+        Registers how values of exactly ``data_type`` are simplified.
+
+        ``simplifier`` is called with the value and the serialization options
+        and should return native types (it may call ``to_simple`` on nested
+        values). Used by ``to_simple`` as well as by the single-pass JSON
+        encoder.
+        """
+        self.simplifiers[data_type] = simplifier
+
+    def simplify_list(self, data, options):
+        to_simple = self.to_simple
+        return [to_simple(item, options) for item in data]
+
+    def simplify_dict(self, data, options):
+        to_simple = self.to_simple
+        return dict((key, to_simple(val, options)) for (key, val) in data.iteritems())
+
+    def simplify_bundle(self, data, options):
+        return self.simplify_dict(data.data, options)
 
     def to_simple(self, data, options):
         """
@@ -201,7 +443,15 @@ class Serializer(object):
 
         This brings complex Python data structures down to native types of the
         serialization format(s).
+
+        Values are first looked up by their exact type in ``simplifiers``;
+        subclasses and related fields fall back on ``isinstance`` checks.
         """
+        simplifier = self.simplifiers.get(type(data))
+
+        if simplifier is not None:
+            return simplifier(data, options)
+
         if isinstance(data, (list, tuple)):
             return [self.to_simple(item, options) for item in data]
         if isinstance(data, dict):
@@ -236,6 +486,70 @@ class Serializer(object):
         else:
             return force_unicode(data)
 
+    def to_native(self, data, options):
+        """
+        Like ``to_simple``, but keeps the values binary formats encode
+        natively as they are: datetimes (given a timezone), dates and
+        ``Decimal``. Strings and dictionary keys come out as unicode.
+        """
+        data_type = type(data)
+
+        if data_type is unicode or data_type in (int, long, float, bool) or data is None:
+            return data
+        elif isinstance(data, datetime.datetime):
+            return to_aware(data)
+        elif isinstance(data, (datetime.date, decimal.Decimal)):
+            return data
+        elif isinstance(data, (list, tuple)):
+            return [self.to_native(item, options) for item in data]
+        elif isinstance(data, dict):
+            return dict((type(key) is str and force_unicode(key) or key, self.to_native(val, options)) for (key, val) in data.iteritems())
+        elif isinstance(data, Bundle):
+            return self.to_native(data.data, options)
+        elif hasattr(data, 'dehydrated_type'):
+            return self.to_native(self.json_default(data), options)
+
+        return self.to_simple(data, options)
+
+    def json_default(self, data):
+        """
+        Called by the JSON engine for every value it can't encode on its own.
+
+        Mirrors ``to_simple`` one level at a time, so handler output can be
+        encoded in a single pass, without building a simplified copy of it
+        first.
+        """
+        # Containers are left to the engine, one level at a time.
+        if type(data) not in (list, tuple, dict, Bundle):
+            simplifier = self.simplifiers.get(type(data))
+
+            if simplifier is not None:
+                return simplifier(data, {})
+
+        if isinstance(data, Bundle):
+            return data.data
+        elif hasattr(data, 'dehydrated_type'):
+            if getattr(data, 'dehydrated_type', None) == 'related' and data.is_m2m == False:
+                if data.full:
+                    return data.fk_resource
+                else:
+                    return data.value
+            elif getattr(data, 'dehydrated_type', None) == 'related' and data.is_m2m == True:
+                if data.full:
+                    return list(data.m2m_bundles)
+                else:
+                    return list(data.value)
+            else:
+                return data.value
+        elif isinstance(data, datetime.datetime):
+            return self.format_datetime(data)
+        elif isinstance(data, datetime.date):
+            return self.format_date(data)
+        elif isinstance(data, datetime.time):
+            return self.format_time(data)
+        else:
+            return force_unicode(data)
+
     def to_etree(self, data, options=None, name=None, depth=0):
         """
         Given some data, converts that data to an ``etree.Element`` suitable
@@ -295,6 +609,108 @@ class Serializer(object):
 
         return element
 
+    def write_etree(self, xf, data, options=None, name=None, depth=0):
+        """
+        Given an ``lxml.etree.xmlfile`` context and some data, writes the
+        same elements ``to_etree`` would build, one at a time.
+
+        Only scalar values and empty containers are turned into ``Element``
+        objects; lists, hashes and bundles are opened and closed around their
+        children.
+        """
+        if isinstance(data, (list, tuple, dict)) and not data:
+            xf.write(self.to_etree(data, options, name, depth))
+        elif isinstance(data, (list, tuple)):
+            if name:
+                with xf.element(name, type='list'):
+                    for item in data:
+                        self.write_etree(xf, item, options, depth=depth+1)
+            else:
+                with xf.element('objects'):
+                    for item in data:
+                        self.write_etree(xf, item, options, depth=depth+1)
+        elif isinstance(data, dict):
+            if depth == 0:
+                context = xf.element(name or 'response')
+            else:
+                context = xf.element(name or 'object', type='hash')
+            with context:
+                for (key, value) in data.iteritems():
+                    self.write_etree(xf, value, options, name=key, depth=depth+1)
+        elif isinstance(data, Bundle) and data.data:
+            with xf.element(name or 'object'):
+                for field_name, field_object in data.data.items():
+                    self.write_etree(xf, field_object, options, name=field_name, depth=depth+1)
+        elif hasattr(data, 'dehydrated_type'):
+            if getattr(data, 'dehydrated_type', None) == 'related' and data.is_m2m == False:
+                if data.full:
+                    self.write_etree(xf, data.fk_resource, options, name, depth+1)
+                else:
+                    self.write_etree(xf, data.value, options, name, depth+1)
+            elif getattr(data, 'dehydrated_type', None) == 'related' and data.is_m2m == True:
+                with xf.element(name or 'objects'):
+                    if data.full:
+                        for bundle in data.m2m_bundles:
+                            self.write_etree(xf, bundle, options, bundle.resource_name, depth+1)
+                    else:
+                        for value in data.value:
+                            self.write_etree(xf, value, options, name, depth=depth+1)
+            else:
+                self.write_etree(xf, data.value, options, name)
+        else:
+            xf.write(self.to_etree(data, options, name, depth))
+
+    def iter_xml(self, data, options=None):
+        """
+        Given some data, yields XML output piece by piece, one top-level
+        item (or value of a top-level hash) at a time.
+
+        A lazy iterable is written as a top-level list of its items.
+        Requires lxml 3.4 or later.
+        """
+        options = options or {}
+
+        if lxml is None:
+            raise ImproperlyConfigured("Usage of the XML aspects requires lxml.")
+
+        output = XMLChunks()
+
+        with xmlfile(output, encoding='utf-8') as xf:
+            xf.write_declaration()
+
+            if isinstance(data, dict):
+                tag, items = 'response', data.iteritems()
+            elif isinstance(data, Bundle):
+                tag, items = 'object', data.data.iteritems()
+            elif isinstance(data, (list, tuple)) or hasattr(data, '__iter__'):
+                tag, items = 'objects', ((None, item) for item in data)
+            else:
+                tag, items = None, None
+
+            if items is not None:
+                try:
+                    first = items.next()
+                except StopIteration:
+                    # Written as an empty element, like ``to_etree`` does.
+                    if tag == 'objects':
+                        data = []
+                    items = None
+                else:
+                    items = itertools.chain([first], items)
+
+            if items is None:
+                self.write_etree(xf, data, options)
+            else:
+                with xf.element(tag):
+                    for key, value in items:
+                        self.write_etree(xf, value, options, name=key, depth=1)
+                        xf.flush()
+
+                        if output.size >= self.stream_chunk_size:
+                            yield output.pop()
+
+        yield output.pop()
+
     def from_etree(self, data):
         """
         Not the smartest deserializer on the planet. At the request level,
@@ -334,14 +750,49 @@ class Serializer(object):
         Given some Python data, produces JSON output.
         """
         options = options or {}
+
+        if options.get('trusted'):
+            # The handler vouched for its output being JSON-native already.
+            return self.json.dumps(data, sort_keys=self.sort_keys)
+
+        if self.fused_json and self.json.supports_default:
+            # On Python 2.7 the standard library only uses its C encoder
+            # without ``sort_keys``; sorted output is encoded in Python, the
+            # single pass then only saves building the ``to_simple`` copy.
+            return self.json.dumps(data, default=self.json_default, sort_keys=self.sort_keys)
+
         data = self.to_simple(data, options)
-        return simplejson.dumps(data, cls=json.DjangoJSONEncoder, sort_keys=True, ensure_ascii=False)
+        return self.json.dumps(data, sort_keys=self.sort_keys)
+
+    def stream_json(self, data, options=None):
+        """
+        Given an iterable, yields a JSON array of its items piece by piece.
+        """
+        options = options or {}
+        separator = '['
+
+        for item in data:
+            yield separator
+            yield self.to_json(item, options)
+            separator = ', '
+
+        if separator == '[':
+            yield '['
+
+        yield ']'
 
     def from_json(self, content):
         """
         Given some JSON data, returns a Python dictionary of the decoded data.
         """
-        return simplejson.loads(content)
+        return self.json.loads(content)
+
+    def read_json(self, content):
+        """
+        Given a file-like object holding JSON, yields the items of its
+        top-level ``objects`` list (or top-level list) as they are read.
+        """
+        return JSONReader(content, self.read_chunk_size, self.max_read_depth, self.max_read_elements).iter_items()
 
     def to_jsonp(self, data, options=None):
         """
@@ -351,6 +802,54 @@ class Serializer(object):
         options = options or {}
         return '%s(%s)' % (options['callback'], self.to_json(data, options))
 
+    def stream_jsonp(self, data, options=None):
+        """
+        Given an iterable, yields a JSON array of its items wrapped in the
+        provided callback, piece by piece.
+        """
+        options = options or {}
+        yield '%s(' % options['callback']
+
+        for chunk in self.stream_json(data, options):
+            yield chunk
+
+        yield ')'
+
+    def to_ndjson(self, data, options=None):
+        """
+        Given some Python data, produces newline-delimited JSON output: one
+        line per item of a list, or a single line otherwise.
+        """
+        options = options or {}
+
+        if not isinstance(data, (list, tuple)):
+            data = [data]
+
+        return ''.join(self.stream_ndjson(data, options))
+
+    def stream_ndjson(self, data, options=None):
+        """
+        Given an iterable, yields newline-delimited JSON, one item per line.
+        """
+        options = options or {}
+
+        for item in data:
+            yield self.to_json(item, options) + '\n'
+
+    def from_ndjson(self, content):
+        """
+        Given some newline-delimited JSON data, returns a Python list of the
+        decoded records.
+        """
+        return [self.json.loads(line) for line in content.splitlines() if line.strip()]
+
+    def read_ndjson(self, content):
+        """
+        Given a file-like object holding newline-delimited JSON, yields the
+        records as they are read.
+        """
+        return JSONReader(content, self.read_chunk_size, self.max_read_depth, self.max_read_elements).iter_values()
+
     def to_xml(self, data, options=None):
         """
         Given some Python data, produces XML output.
@@ -360,7 +859,22 @@ class Serializer(object):
         if lxml is None:
             raise ImproperlyConfigured("Usage of the XML aspects requires lxml.")
 
-        return tostring(self.to_etree(data, options), xml_declaration=True, encoding='utf-8')
+        if self.to_etree.im_func is not Serializer.to_etree.im_func:
+            return tostring(self.to_etree(data, options), xml_declaration=True, encoding='utf-8')
+
+        # Written incrementally rather than building the whole tree first.
+        return ''.join(self.iter_xml(data, options))
+
+    def stream_xml(self, data, options=None):
+        """
+        Given an iterable, yields an XML list of its items piece by piece.
+        """
+        if self.to_etree.im_func is not Serializer.to_etree.im_func:
+            yield self.to_xml(list(data), options)
+            return
+
+        for chunk in self.iter_xml(iter(data), options):
+            yield chunk
 
     def from_xml(self, content):
         """
@@ -369,7 +883,65 @@ class Serializer(object):
         if lxml is None:
             raise ImproperlyConfigured("Usage of the XML aspects requires lxml.")
 
-        return self.from_etree(parse_xml(StringIO(content)).getroot())
+        # Like ``read_xml``, never load external entities (XXE).
+        parser = XMLParser(resolve_entities=False, no_network=True, huge_tree=False)
+        return self.from_etree(parse_xml(StringIO(content), parser).getroot())
+
+    def read_xml(self, content):
+        """
+        Given a file-like object holding XML, yields the deserialized items
+        of its ``objects`` element as they are parsed, discarding each one
+        once it is converted.
+        """
+        if lxml is None:
+            raise ImproperlyConfigured("Usage of the XML aspects requires lxml.")
+
+        root = None
+        chosen = None
+        container = None
+        depth = 0
+        elements = 0
+        events = iterparse(content, events=('start', 'end'), resolve_entities=False, no_network=True)
+
+        try:
+            for event, element in events:
+                if event == 'start':
+                    depth += 1
+                    elements += 1
+
+                    if depth > self.max_read_depth:
+                        raise BadRequest('The XML document is nested too deeply.')
+
+                    if elements > self.max_read_elements:
+                        raise BadRequest('The XML document has too many elements.')
+
+                    if depth == 1:
+                        root = element
+
+                        if element.tag == 'objects' or element.get('type') == 'list':
+                            container = element
+                    elif depth == 2 and root.tag == 'request' and chosen is None and element.tag in ('object', 'objects'):
+                        # Same lookup as ``from_etree``.
+                        chosen = element
+
+                        if element.tag == 'objects':
+                            container = element
+
+                    continue
+
+                depth -= 1
+
+                if container is not None and element.getparent() is container:
+                    yield self.from_etree(element)
+                    element.clear()
+
+                    while element.getprevious() is not None:
+                        del container[0]
+        except lxml.etree.XMLSyntaxError, e:
+            raise BadRequest('Invalid XML: %s' % e)
+
+        if container is None:
+            yield self.from_etree(chosen if chosen is not None else root)
 
     def to_yaml(self, data, options=None):
         """
@@ -380,15 +952,23 @@ class Serializer(object):
         if yaml is None:
             raise ImproperlyConfigured("Usage of the YAML aspects requires yaml.")
 
-        return yaml.dump(self.to_simple(data, options))
+        if not options.get('trusted'):
+            data = self.to_simple(data, options)
+
+        return yaml.dump(data)
 
     def from_yaml(self, content):
         """
         Given some YAML data, returns a Python dictionary of the decoded data.
+
+        Documents larger than ``max_read_size`` or using aliases are refused.
         """
         if yaml is None:
             raise ImproperlyConfigured("Usage of the YAML aspects requires yaml.")
 
+        if len(content) > self.max_read_size:
+            raise RequestTooLarge('The YAML document is larger than %d bytes.' % self.max_read_size)
+
         return yaml.load(content, Loader=RestumizeLoader)
 
     def to_plist(self, data, options=None):
@@ -400,7 +980,10 @@ class Serializer(object):
         if biplist is None:
             raise ImproperlyConfigured("Usage of the plist aspects requires biplist.")
 
-        return biplist.writePlistToString(self.to_simple(data, options))
+        if not options.get('trusted'):
+            data = self.to_simple(data, options)
+
+        return biplist.writePlistToString(data)
 
     def from_plist(self, content):
         """
@@ -411,6 +994,90 @@ class Serializer(object):
 
         return biplist.readPlistFromString(content)
 
+    def to_msgpack(self, data, options=None):
+        """
+        Given some Python data, produces MessagePack output.
+        """
+        options = options or {}
+
+        if msgpack is None:
+            raise ImproperlyConfigured("Usage of the MessagePack aspects requires msgpack.")
+
+        if not options.get('trusted') and not self.fused_json:
+            data = self.to_simple(data, options)
+
+        # Python 2 ``str`` is text here, so it is packed as a string too.
+        return msgpack.packb(data, default=self.msgpack_default, use_bin_type=False)
+
+    def msgpack_default(self, data):
+        """
+        Called by the MessagePack encoder for every value it can't encode on
+        its own.
+
+        Datetimes become timestamp extensions with msgpack 1.0+. Older
+        releases can't write the reserved timestamp type, so they get the
+        ``MSGPACK_DATETIME`` application extension (same data) instead.
+        Anything else goes through ``json_default`` until the encoder can
+        take it, so ``Decimal`` (which MessagePack has no type for) is
+        written as a string.
+        """
+        while True:
+            if isinstance(data, datetime.datetime):
+                if hasattr(msgpack, 'Timestamp'):
+                    return msgpack.Timestamp.from_bytes(pack_timestamp(data))
+
+                return msgpack.ExtType(MSGPACK_DATETIME, pack_timestamp(data))
+
+            data = self.json_default(data)
+
+            if type(data) in MSGPACK_TYPES:
+                return data
+
+    def msgpack_ext_hook(self, code, data):
+        """
+        Decodes the MessagePack extensions: timestamps (and
+        ``MSGPACK_DATETIME``) become aware (UTC) datetimes.
+        """
+        if code in (MSGPACK_TIMESTAMP, MSGPACK_DATETIME):
+            return unpack_timestamp(data)
+
+        return msgpack.ExtType(code, data)
+
+    def from_msgpack(self, content):
+        """
+        Given some MessagePack data, returns a Python dictionary of the decoded data.
+        """
+        if msgpack is None:
+            raise ImproperlyConfigured("Usage of the MessagePack aspects requires msgpack.")
+
+        if hasattr(msgpack, 'Timestamp'):
+            # msgpack 1.0+ decodes timestamps itself, before ``ext_hook``.
+            return msgpack.unpackb(content, ext_hook=self.msgpack_ext_hook, raw=False, timestamp=3)
+
+        return msgpack.unpackb(content, ext_hook=self.msgpack_ext_hook, raw=False)
+
+    def to_cbor(self, data, options=None):
+        """
+        Given some Python data, produces CBOR output.
+        """
+        options = options or {}
+
+        if cbor2 is None:
+            raise ImproperlyConfigured("Usage of the CBOR aspects requires cbor2.")
+
+        # Even trusted output is walked, as the encoder writes Python 2
+        # ``str`` as bytes.
+        return cbor2.dumps(self.to_native(data, options))
+
+    def from_cbor(self, content):
+        """
+        Given some CBOR data, returns a Python dictionary of the decoded data.
+        """
+        if cbor2 is None:
+            raise ImproperlyConfigured("Usage of the CBOR aspects requires cbor2.")
+
+        return cbor2.loads(content)
+
     def to_html(self, data, options=None):
         """
         Reserved for future usage.
@@ -432,6 +1099,311 @@ class Serializer(object):
         """
         pass
 
+# The containers and numbers ``json`` decodes to.
+CONTAINER_TYPES = (dict, list)
+NUMBER_TYPES = (int, long, float)
+
+
+class LimitedReader(object):
+    """
+    Wraps a file-like object, refusing to read more than ``max_size`` bytes
+    from it.
+    """
+    def __init__(self, content, max_size):
+        self.content = content
+        self.max_size = max_size
+        self.size = 0
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            data = self.content.read(self.max_size - self.size + 1)
+        else:
+            data = self.content.read(size)
+
+        self.size += len(data)
+
+        if self.size > self.max_size:
+            raise RequestTooLarge('The request body is larger than %d bytes.' % self.max_size)
+
+        return data
+
+
+class JSONReader(object):
+    """
+    Incrementally decodes the items of the top-level ``objects`` list (or
+    top-level list) of a JSON document read from a file-like object, with
+    ``raw_decode`` on a sliding buffer.
+
+    Each item is only decoded once the buffer holds all of it, so at most
+    one item and one chunk are kept in memory at a time.
+    """
+    whitespace = ' \t\n\r'
+    delimiters = ',]}' + whitespace
+
+    def __init__(self, content, chunk_size, max_depth, max_elements):
+        self.content = content
+        self.chunk_size = chunk_size
+        self.max_depth = max_depth
+        self.max_elements = max_elements
+        self.elements = 0
+        self.buffer = ''
+        self.position = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def iter_items(self):
+        character = self.next_character()
+
+        if character == '[':
+            for item in self.iter_array(depth=1):
+                yield item
+        elif character == '{':
+            data = {}
+            items = None
+
+            for key in self.iter_keys():
+                if key == 'objects' and items is None and self.next_character(consume=False) == '[':
+                    self.next_character()
+                    items = self.iter_array(depth=2)
+
+                    for item in items:
+                        yield item
+                else:
+                    data[key] = self.decode_value(depth=1)
+
+            if items is None:
+                yield data
+        elif character is None:
+            self.fail('empty document')
+        else:
+            self.position -= 1
+            yield self.decode_value()
+
+        if self.next_character() is not None:
+            self.fail('trailing data')
+
+    def iter_values(self):
+        """
+        Yields the top-level values of a document holding a sequence of them,
+        such as newline-delimited JSON.
+        """
+        while self.next_character(consume=False) is not None:
+            yield self.decode_value()
+
+    def iter_array(self, depth):
+        """
+        Yields the values of an array at ``depth`` whose ``[`` was just
+        consumed.
+        """
+        if self.next_character(consume=False) == ']':
+            self.next_character()
+            return
+
+        while True:
+            yield self.decode_value(depth=depth)
+            character = self.next_character()
+
+            if character == ']':
+                return
+
+            if character != ',':
+                self.fail("expected ',' or ']'")
+
+    def iter_keys(self):
+        """
+        Yields the keys of an object whose ``{`` was just consumed, leaving
+        each value to be consumed by the caller.
+        """
+        if self.next_character(consume=False) == '}':
+            self.next_character()
+            return
+
+        while True:
+            if self.next_character(consume=False) != '"':
+                self.fail('expected a key')
+
+            key = self.decode_value(depth=1)
+
+            if self.next_character() != ':':
+                self.fail("expected ':'")
+
+            yield key
+            character = self.next_character()
+
+            if character == '}':
+                return
+
+            if character != ',':
+                self.fail("expected ',' or '}'")
+
+    def decode_value(self, depth=1):
+        """
+        Decodes the value at ``depth`` starting at the current position,
+        reading more content until the buffer holds all of it.
+        """
+        self.next_character(consume=False)
+        # Read twice as much each time a large value is still incomplete,
+        # so it is parsed again only a few times.
+        size = self.chunk_size
+
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+            except ValueError:
+                end = None
+            except RuntimeError:
+                self.fail('nested too deeply')
+
+            # A number could go on in the next chunk ("0." decodes as 0), so
+            # it is only complete once a delimiter follows it.
+            if end is not None and (self.eof or end < len(self.buffer) and (type(value) not in NUMBER_TYPES or self.buffer[end] in self.delimiters)):
+                break
+
+            if self.eof:
+                self.fail('invalid value')
+
+            self.read(size)
+            size *= 2
+
+        self.position = end
+
+        if type(value) in CONTAINER_TYPES:
+            self.check(value, depth)
+        else:
+            self.elements += 1
+
+            if self.elements > self.max_elements:
+                self.fail('too many elements')
+        return value
+
+    def check(self, value, depth):
+        """
+        Enforces the depth and element limits on a decoded value.
+        """
+        self.elements += 1
+        pending = [(value, depth)]
+
+        while pending:
+            value, depth = pending.pop()
+
+            if depth > self.max_depth:
+                self.fail('nested too deeply')
+
+            if type(value) is dict:
+                value = value.values()
+
+            self.elements += len(value)
+
+            for child in value:
+                if type(child) in CONTAINER_TYPES:
+                    pending.append((child, depth + 1))
+
+        if self.elements > self.max_elements:
+            self.fail('too many elements')
+
+    def next_character(self, consume=True):
+        """
+        Skips whitespace and returns the next character (``None`` at the
+        end of the content), consuming it unless ``consume`` is false.
+        """
+        while True:
+            while self.position < len(self.buffer) and self.buffer[self.position] in self.whitespace:
+                self.position += 1
+
+            if self.position < len(self.buffer):
+                character = self.buffer[self.position]
+
+                if consume:
+                    self.position += 1
+
+                return character
+
+            if self.eof:
+                return None
+
+            self.read()
+
+    def read(self, size=None):
+        chunk = self.content.read(size or self.chunk_size)
+
+        if not chunk:
+            self.eof = True
+            return
+
+        # Drop what was already decoded before growing the buffer.
+        self.buffer = self.buffer[self.position:] + chunk
+        self.position = 0
+
+    def fail(self, reason):
+        raise BadRequest('Invalid JSON: %s.' % reason)
+
+
+class XMLChunks(object):
+    """
+    The file ``lxml.etree.xmlfile`` writes to when XML is produced
+    incrementally; collects the output until it is popped.
+    """
+    def __init__(self):
+        self.chunks = []
+        self.size = 0
+
+    def write(self, data):
+        self.chunks.append(data)
+        self.size += len(data)
+
+    def pop(self):
+        data = ''.join(self.chunks)
+        self.chunks = []
+        self.size = 0
+        return data
+
+
+# The MessagePack extension type of timestamps, the application type used
+# for datetimes when msgpack can't write timestamps, and the types its
+# encoder takes as they are.
+MSGPACK_TIMESTAMP = -1
+MSGPACK_DATETIME = 1
+MSGPACK_TYPES = (dict, list, tuple, unicode, str, int, long, float, bool, type(None))
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=utc)
+
+
+def pack_timestamp(value):
+    """
+    Encodes a datetime as the data of a MessagePack timestamp extension, in
+    the smallest of its 32, 64 and 96-bit forms.
+    """
+    value = to_aware(value)
+    seconds = calendar.timegm(value.utctimetuple())
+    nanoseconds = value.microsecond * 1000
+
+    if seconds >> 34 == 0:
+        if nanoseconds == 0 and seconds >> 32 == 0:
+            return struct.pack('>I', seconds)
+
+        return struct.pack('>Q', nanoseconds << 34 | seconds)
+
+    return struct.pack('>Iq', nanoseconds, seconds)
+
+
+def unpack_timestamp(data):
+    """
+    Decodes the data of a MessagePack timestamp extension into an aware (UTC)
+    datetime.
+    """
+    if len(data) == 4:
+        seconds, = struct.unpack('>I', data)
+        nanoseconds = 0
+    elif len(data) == 8:
+        value, = struct.unpack('>Q', data)
+        seconds, nanoseconds = value & 0x3ffffffff, value >> 34
+    elif len(data) == 12:
+        nanoseconds, seconds = struct.unpack('>Iq', data)
+    else:
+        raise ValueError("Invalid MessagePack timestamp of %d bytes." % len(data))
+
+    return EPOCH + datetime.timedelta(seconds=seconds, microseconds=nanoseconds // 1000)
+
+
 def get_type_string(data):
     """
     Translates a Python data type into a string format.
@@ -5,10 +5,22 @@ from django.utils import unittest
 from urlparse import urlparse
 from django.conf import settings
 from django.test import TestCase
-from django.test.client import FakePayload, Client
+from django.test.client import FakePayload, Client, RequestFactory
 
-from restumize.serializers import Serializer
-from restumize import api, handler, fields
+from django.contrib.auth.models import User
+from restumize.authorization import Authorization
+from restumize.cache import SimpleCache, TieredCache, RefreshAheadCache, get_tag, get_tag_key, get_tag_versions, invalidate_tags, local_tag_versions
+from restumize.serializers import Serializer, lxml, msgpack, cbor2
+from restumize import api, batch, compression, handler, fields
+try:
+	import simplejson
+except ImportError:
+	simplejson = None
+
+try:
+	import ujson
+except ImportError:
+	ujson = None
 
 
 class TestHandler(handler.BaseHandler):
@@ -37,6 +49,129 @@ class TestHandler(handler.BaseHandler):
 		return data
 
 
+class HookedHandler(handler.BaseHandler):
+	name = fields.CharField()
+	count = fields.IntegerField(required=False)
+
+	def clean_name(self):
+		return self._cleaned_data['name'].upper()
+
+
+class ReusableHandler(handler.BaseHandler):
+	class Meta:
+		resource_name = 'reusable'
+		reusable = True
+
+	name = fields.CharField()
+
+	def clean_name(self, context):
+		return context.cleaned_data['name'].upper()
+
+	def get(self, request, context=None, **kwargs):
+		return {'name': context.cleaned_data['name'], 'instance': id(self)}
+
+
+class BodyHandler(handler.BaseHandler):
+	class Meta:
+		resource_name = 'body'
+		authorization = Authorization()
+
+	count = fields.IntegerField()
+	ratio = fields.FloatField(required=False)
+
+	def post(self, request, **kwargs):
+		return {'count': self.count, 'ratio': self.ratio}
+
+	put = patch = post
+
+
+class LimitedHandler(BodyHandler):
+	class Meta:
+		resource_name = 'limited'
+		authorization = Authorization()
+		max_body_size = 1000
+		max_fields = 3
+		max_files = 1
+		max_file_size = 10
+
+	upload = fields.FileField(required=False)
+
+
+class CompressedHandler(BodyHandler):
+	class Meta:
+		resource_name = 'compressed'
+		authorization = Authorization()
+		request_encodings = ('gzip', 'deflate')
+		max_decompression_ratio = 20
+
+
+class StreamingHandler(handler.BaseHandler):
+	class Meta:
+		resource_name = 'streaming'
+
+	count = fields.IntegerField()
+
+	def get(self, request, **kwargs):
+		return ({'id': index} for index in xrange(self.count))
+
+
+class ConditionalHandler(handler.BaseHandler):
+	class Meta:
+		resource_name = 'conditional'
+
+	calls = []
+
+	def get_etag(self, request, cleaned_data):
+		return 'v1'
+
+	def get_last_modified(self, request, cleaned_data):
+		return datetime.datetime(2012, 8, 17, 14, 15, 45)
+
+	def get(self, request, **kwargs):
+		self.calls.append(request.method)
+		return {'status': 'ok'}
+
+
+class CachedHandler(handler.BaseHandler):
+	class Meta:
+		resource_name = 'cached'
+		cache = SimpleCache(timeout=60, cache_name='locmem://')
+		cache_timeout = 30
+
+	name = fields.CharField()
+	calls = []
+
+	def get(self, request, **kwargs):
+		self.calls.append(self.name)
+		return {'name': self.name}
+
+
+class TaggedHandler(CachedHandler):
+	class Meta:
+		resource_name = 'tagged'
+		cache = SimpleCache(timeout=60, cache_name='locmem://')
+		cache_tags = [User, 'Profiles']
+
+
+class CompressedCachedHandler(CachedHandler):
+	class Meta:
+		resource_name = 'compressed_cached'
+		cache = TieredCache(timeout=60, cache_name='locmem://')
+		response_encodings = ('gzip',)
+		compression_threshold = 100
+
+
+class RefreshedStreamingHandler(StreamingHandler):
+	class Meta:
+		resource_name = 'refreshed_streaming'
+		cache = RefreshAheadCache(timeout=60, cache_name='locmem://', lock_wait=10)
+
+
+class ProxyUser(User):
+	class Meta:
+		proxy = True
+
+
 class DummyRequest():
 	def __init__(self):
 		self.now = datetime.datetime(2012, 8, 17, 14, 15, 45)
@@ -116,6 +251,561 @@ class ResourceTestCase(unittest.TestCase):
 		self.assertEqual(handler.test_bool, True)
 		self.assertEqual(handler.test_null_bool, None)
 		
+	def testCleanPlan(self):
+		plan = dict((step.name, step) for step in HookedHandler._clean_plan)
+		self.assertEqual(sorted(plan.keys()), ['count', 'name'])
+		self.assertTrue(plan['count'].hook is None)
+		self.assertTrue(plan['name'].hook is not None)
+
+		handler = HookedHandler({'name': 'abc', 'count': '3'})
+		self.assertTrue(handler.fields is HookedHandler.base_fields)
+		self.assertEqual(handler._is_valid(), True)
+		self.assertEqual(handler.name, u'ABC')
+		self.assertEqual(handler.count, 3)
+
+		handler = HookedHandler({'count': 'x'})
+		self.assertEqual(handler._is_valid(), False)
+		self.assertEqual(sorted(handler._errors.keys()), ['count', 'name'])
+
+	def testReusableHandler(self):
+		import json
+		apiset = api.Api('test_api')
+		view = apiset.wrap_view(ReusableHandler)
+		factory = RequestFactory()
+
+		first = json.loads(view(factory.get('/', {'name': 'abc'})).content)
+		second = json.loads(view(factory.get('/', {'name': 'def'})).content)
+		self.assertEqual(first['name'], 'ABC')
+		self.assertEqual(second['name'], 'DEF')
+		self.assertEqual(first['instance'], second['instance'])
+
+		# No request state is left on the shared instance.
+		shared = apiset._shared_resources[ReusableHandler]
+		self.assertEqual(id(shared), first['instance'])
+		self.assertFalse('name' in shared.__dict__)
+		self.assertFalse(hasattr(shared, '_errors'))
+		self.assertFalse(hasattr(shared, '_cleaned_data'))
+
+		response = view(factory.get('/'))
+		self.assertEqual(response.status_code, 400)
+
+		request = factory.get('/')
+		context = shared._get_context(request)
+		self.assertFalse(shared._is_valid(context))
+		self.assertEqual(shared._get_error_list(context), [('name', [u'This field is required.'])])
+
+	def testDispatchTable(self):
+		meta = ReusableHandler._meta
+		self.assertEqual(sorted(meta.dispatch_table.keys()), ['DELETE', 'GET', 'HEAD', 'PATCH', 'POST', 'PUT'])
+		self.assertEqual(meta.allow_header, 'GET,POST,PUT,DELETE,PATCH')
+
+		view = api.Api('test_api').wrap_view(ReusableHandler)
+		request = RequestFactory().options('/')
+		response = view(request)
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(response['Allow'], meta.allow_header)
+
+		request = RequestFactory().get('/')
+		request.method = 'TRACE'
+		response = view(request)
+		self.assertEqual(response.status_code, 405)
+		self.assertEqual(response['Allow'], meta.allow_header)
+
+	def testBatch(self):
+		import json
+		apiset = api.Api('test_api', batch=True, batch_workers=2)
+		apiset.register(ReusableHandler)
+		apiset.register(HookedHandler)
+		apiset.register(StreamingHandler)
+		view = apiset.wrap_view(batch.BatchHandler)
+
+		entries = [
+			{'method': 'GET', 'resource_name': 'reusable', 'params': {'name': 'abc'}},
+			{'method': 'GET', 'resource_name': 'reusable', 'params': {}},
+			{'method': 'DELETE', 'resource_name': 'reusable'},
+			{'method': 'GET', 'resource_name': 'missing'},
+			{'method': 'GET', 'resource_name': 'streaming', 'params': {'count': 2}},
+		]
+		request = RequestFactory().post('/', json.dumps(entries), content_type='application/json')
+		response = view(request, api=apiset)
+		self.assertEqual(response.status_code, 200)
+
+		results = json.loads(response.content)
+		self.assertEqual([result['status'] for result in results], [200, 400, 401, 404, 200])
+		self.assertEqual(json.loads(results[0]['body'])['name'], 'ABC')
+		self.assertEqual(json.loads(results[4]['body']), [{'id': 0}, {'id': 1}])
+		self.assertTrue(apiset.get_batch_pool() is apiset.get_batch_pool())
+
+		request = RequestFactory().post('/', json.dumps({'resource_name': 'reusable'}), content_type='application/json')
+		self.assertEqual(view(request, api=apiset).status_code, 400)
+
+	def testStreamingResponse(self):
+		import json
+		view = api.Api('test_api').wrap_view(StreamingHandler)
+
+		response = view(RequestFactory().get('/', {'count': 3}))
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(json.loads(''.join(response)), [{'id': 0}, {'id': 1}, {'id': 2}])
+
+		response = view(RequestFactory().get('/', {'count': 0, 'callback': 'cb'}))
+		self.assertEqual(''.join(response), 'cb([])')
+
+	def testNDJSON(self):
+		from restumize.exceptions import BadRequest
+
+		view = api.Api('test_api').wrap_view(StreamingHandler)
+		response = view(RequestFactory().get('/', {'count': 3, 'format': 'ndjson'}))
+		self.assertTrue(response['Content-Type'].startswith('application/x-ndjson'))
+		self.assertEqual(''.join(response), '{"id": 0}\n{"id": 1}\n{"id": 2}\n')
+
+		response = view(RequestFactory().get('/', {'count': 0}, HTTP_ACCEPT='application/x-ndjson'))
+		self.assertEqual(''.join(response), '')
+
+		serializer = Serializer()
+		self.assertEqual(serializer.to_ndjson({'a': [1, 2]}), '{"a": [1, 2]}\n')
+		self.assertEqual(serializer.from_ndjson('{"id": 0}\n\n[1]\n'), [{'id': 0}, [1]])
+
+		serializer.read_chunk_size = 4
+		content = '{"id": 0}\n{"id": 1, "tags": ["a"]}\n"b"\n'
+		self.assertEqual(list(serializer.deserialize_stream(content, 'application/x-ndjson')), [{'id': 0}, {'id': 1, 'tags': ['a']}, 'b'])
+		self.assertRaises(BadRequest, list, serializer.deserialize_stream('{"id": 0}\n{"id"', 'application/x-ndjson'))
+
+	def testConditionalGet(self):
+		view = api.Api('test_api').wrap_view(ConditionalHandler)
+		factory = RequestFactory()
+		del ConditionalHandler.calls[:]
+
+		response = view(factory.get('/'))
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(response['ETag'], '"v1"')
+		self.assertEqual(response['Last-Modified'], 'Fri, 17 Aug 2012 14:15:45 GMT')
+
+		response = view(factory.get('/', HTTP_IF_NONE_MATCH='"v1"'))
+		self.assertEqual(response.status_code, 304)
+		response = view(factory.get('/', HTTP_IF_NONE_MATCH='"v0"'))
+		self.assertEqual(response.status_code, 200)
+		response = view(factory.get('/', HTTP_IF_MODIFIED_SINCE='Fri, 17 Aug 2012 14:15:45 GMT'))
+		self.assertEqual(response.status_code, 304)
+		self.assertEqual(ConditionalHandler.calls, ['GET', 'GET'])
+
+		request = factory.get('/')
+		request.method = 'HEAD'
+		response = view(request)
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(response.content, '')
+		self.assertEqual(response['ETag'], '"v1"')
+
+	def testResponseCache(self):
+		view = api.Api('test_api').wrap_view(CachedHandler)
+		factory = RequestFactory()
+		del CachedHandler.calls[:]
+
+		first = view(factory.get('/', {'name': 'abc'}))
+		second = view(factory.get('/', {'name': 'abc'}))
+		other = view(factory.get('/', {'name': 'def'}))
+		jsonp = view(factory.get('/', {'name': 'abc', 'callback': 'cb'}))
+		self.assertEqual(first.content, second.content)
+		self.assertEqual(second['Content-Type'], 'application/json; charset=utf-8')
+		self.assertNotEqual(first.content, other.content)
+		self.assertEqual(jsonp.content, 'cb(%s)' % first.content)
+		self.assertEqual(CachedHandler.calls, [u'abc', u'def', u'abc'])
+
+		# Other apis and URL arguments get entries of their own.
+		del CachedHandler.calls[:]
+		view(factory.get('/', {'name': 'abc'}), pk='1')
+		view(factory.get('/', {'name': 'abc'}), pk='1')
+		view(factory.get('/', {'name': 'abc'}), pk='2')
+		view(factory.get('/', {'name': 'abc'}), api_name='v1', pk='1')
+		view(factory.get('/', {'name': 'abc'}), api_name='v2', pk='1')
+		self.assertEqual(CachedHandler.calls, [u'abc', u'abc', u'abc', u'abc'])
+
+	def testResponseCompression(self):
+		import gzip, json
+		from StringIO import StringIO
+		view = api.Api('test_api').wrap_view(CompressedCachedHandler)
+		factory = RequestFactory()
+		del CachedHandler.calls[:]
+
+		first = view(factory.get('/', {'name': 'x' * 200}, HTTP_ACCEPT_ENCODING='br;q=1, gzip;q=0.5'))
+		second = view(factory.get('/', {'name': 'x' * 200}, HTTP_ACCEPT_ENCODING='gzip'))
+		plain = view(factory.get('/', {'name': 'x' * 200}, HTTP_ACCEPT_ENCODING='gzip;q=0, identity'))
+		small = view(factory.get('/', {'name': 'abc'}, HTTP_ACCEPT_ENCODING='gzip'))
+		self.assertEqual(CachedHandler.calls, [u'x' * 200, u'abc'])
+
+		self.assertEqual(first['Content-Encoding'], 'gzip')
+		self.assertEqual(first['Vary'], 'Accept-Encoding')
+		self.assertEqual(first.content, second.content)
+		self.assertEqual(json.loads(gzip.GzipFile(fileobj=StringIO(second.content)).read()), {'name': 'x' * 200})
+		self.assertFalse(plain.has_header('Content-Encoding'))
+		self.assertEqual(json.loads(plain.content), {'name': 'x' * 200})
+		self.assertFalse(small.has_header('Content-Encoding'))
+		self.assertEqual(small['Vary'], 'Accept-Encoding')
+
+	def testBatchCompression(self):
+		import json
+		apiset = api.Api('test_api', batch=True)
+		apiset.register(CompressedCachedHandler)
+		view = apiset.wrap_view(batch.BatchHandler)
+
+		entries = [{'method': 'GET', 'resource_name': 'compressed_cached', 'params': {'name': 'y' * 200}}]
+		request = RequestFactory().post('/', json.dumps(entries), content_type='application/json', HTTP_ACCEPT_ENCODING='gzip')
+		results = json.loads(view(request, api=apiset).content)
+		self.assertEqual(json.loads(results[0]['body']), {'name': 'y' * 200})
+
+	def testTieredCache(self):
+		from restumize.utils import LRUCache
+		lru = LRUCache(max_entries=2, max_size=10)
+		lru.set('a', 'aaaa', size=4)
+		lru.set('b', 'bbbb', size=4)
+		lru.get('a')
+		lru.set('c', 'cccc', size=4)
+		self.assertEqual(lru.get('b'), None)
+		self.assertEqual(lru.get('a'), 'aaaa')
+		lru.set('d', 'd' * 11, size=11)
+		self.assertEqual(lru.get('d'), None)
+		self.assertEqual((lru.hits, lru.misses, lru.size), (2, 2, 8))
+
+		cache = TieredCache(timeout=60, cache_name='locmem://', local_timeout=5)
+		cache.set('key', {'content': 'abc'})
+		cache.local.clear()
+		self.assertEqual(cache.get('key'), {'content': 'abc'})
+		self.assertEqual(cache.get('key'), {'content': 'abc'})
+		self.assertEqual(cache.get('missing'), None)
+		self.assertEqual(cache.stats(), {'local_hits': 1, 'shared_hits': 1, 'misses': 1})
+
+	def testRefreshAheadCache(self):
+		cache = RefreshAheadCache(timeout=60, cache_name='locmem://', lock_wait=0)
+		self.assertEqual(cache.get('key'), None)
+		# Without time to wait for the lock holder, callers build the entry too.
+		self.assertEqual(cache.get('key'), None)
+		cache.set('key', 'value')
+		self.assertEqual(cache.get('key'), 'value')
+
+		entry = cache.cache.get('key')
+		entry['expires'] -= 120
+		cache.cache.set('key', entry)
+		self.assertEqual(cache.get('key'), None)
+		self.assertEqual(cache.get('key'), 'value')
+		cache.set('key', 'new value')
+		self.assertEqual(cache.get('key'), 'new value')
+
+		# Only the lock holder releases the lock.
+		self.assertEqual(cache.get('held'), None)
+		other = RefreshAheadCache(timeout=60, cache_name='locmem://', lock_wait=0)
+		self.assertEqual(other.get('held'), None)
+		other.set('held', 'value')
+		self.assertEqual(cache.cache.get(cache.get_lock_key('held')), 1)
+		cache.set('held', 'value')
+		self.assertEqual(cache.cache.get(cache.get_lock_key('held')), None)
+
+		# Giving up a rebuild releases the lock for the next caller.
+		self.assertEqual(cache.get('other'), None)
+		cache.release('other')
+		self.assertEqual(cache.cache.get(cache.get_lock_key('other')), None)
+
+		import time
+		view = api.Api('test_api').wrap_view(RefreshedStreamingHandler)
+		started = time.time()
+		for attempt in range(2):
+			self.assertEqual(''.join(view(RequestFactory().get('/', {'count': 1}))), '[{"id": 0}]')
+		self.assertTrue(time.time() - started < 5)
+
+	def testNegotiationCache(self):
+		serializer = Serializer()
+		accept = 'application/xml;q=0.9, application/json'
+		self.assertEqual(serializer.get_mime_for_accept(accept), 'application/json')
+		self.assertEqual(serializer.get_mime_for_accept(accept), 'application/json')
+		self.assertEqual(serializer.get_mime_for_accept('image/png'), '')
+		self.assertEqual(serializer._accept_cache.hits, 1)
+
+		self.assertEqual(serializer.is_valid_callback('cb'), True)
+		self.assertEqual(serializer.is_valid_callback('alert(1)'), False)
+		self.assertEqual(serializer.is_valid_callback('alert(1)'), False)
+		self.assertEqual(serializer.get_content_type('text/yaml'), 'text/yaml; charset=utf-8')
+		self.assertEqual(serializer.get_content_type('text/yaml; charset=latin-1'), 'text/yaml; charset=latin-1')
+
+	def testFormatDispatch(self):
+		from restumize.exceptions import UnsupportedFormat
+		serializer = Serializer()
+		self.assertEqual(serializer.serialize({'a': 1}, 'application/json; charset=utf-8'), '{"a": 1}')
+		self.assertEqual(serializer.deserialize('{"a": 1}', 'application/json; charset=utf-8'), {'a': 1})
+		self.assertRaises(UnsupportedFormat, serializer.serialize, {'a': 1}, 'image/png')
+		self.assertRaises(UnsupportedFormat, serializer.deserialize, '', 'text/javascript')
+
+	def testJSONBackends(self):
+		import decimal
+		from django.core.exceptions import ImproperlyConfigured
+		data = {'b': decimal.Decimal('1.5'), 'a': [1, u'\xe9']}
+
+		for backend in ('simplejson', 'json'):
+			serializer = Serializer(json_backend=backend)
+			self.assertEqual(serializer.from_json(serializer.to_json(data)), {'a': [1, u'\xe9'], 'b': '1.5'})
+
+		self.assertEqual(Serializer(json_backend='json').to_json(data), u'{"a": [1, "\xe9"], "b": "1.5"}')
+		self.assertEqual(Serializer(json_backend='json', sort_keys=False).to_json({'b': 1}), '{"b": 1}')
+		self.assertRaises(ImproperlyConfigured, Serializer, json_backend='bson')
+
+	@unittest.skipIf(simplejson is None, "simplejson is not installed")
+	def testSimpleJSONOptions(self):
+		import collections, decimal
+		from restumize.utils.json_backends import SimpleJSONBackend
+
+		class Backend(SimpleJSONBackend):
+			module = simplejson
+
+		serializer = Serializer()
+		serializer.json = Backend()
+		Point = collections.namedtuple('Point', 'x y')
+		self.assertEqual(serializer.to_json({'amount': decimal.Decimal('1.50'), 'point': Point(1, 2)}), '{"amount": "1.50", "point": [1, 2]}')
+
+	@unittest.skipIf(ujson is None, "ujson is not installed")
+	def testUltraJSON(self):
+		import decimal
+		from restumize.bundle import Bundle
+		now = datetime.datetime(2012, 8, 17, 14, 15, 45)
+		data = {'bundle': Bundle(data={'when': now, 'tags': (u'\xe9', 'b/c')}), 'amount': decimal.Decimal('1.50'), 'ratio': 0.1}
+		serializer = Serializer(json_backend='ujson')
+		self.assertEqual(serializer.to_json(data), u'{"amount":"1.50","bundle":{"tags":["\xe9","b/c"],"when":"2012-08-17T14:15:45"},"ratio":0.1}')
+		self.assertEqual(serializer.from_json(serializer.to_json(data)), Serializer().from_json(Serializer().to_json(data)))
+
+	def testFusedJSON(self):
+		import decimal
+		from django.utils.translation import ugettext_lazy
+		from restumize.bundle import Bundle
+
+		class Related(object):
+			dehydrated_type = 'related'
+			is_m2m = True
+			full = True
+
+			def __init__(self, bundles):
+				self.m2m_bundles = bundles
+
+		now = datetime.datetime(2012, 8, 17, 14, 15, 45)
+		data = {
+			'bundle': Bundle(data={'when': now, 'tags': (u'a', 'b')}),
+			'related': Related([Bundle(data={'day': now.date(), 'at': now.time()})]),
+			'amount': decimal.Decimal('1.50'),
+			'label': ugettext_lazy(u'Lazy'),
+			'items': [1, 2.5, None, True],
+		}
+		serializer = Serializer()
+		self.assertTrue(serializer.fused_json)
+		expected = serializer.json.dumps(serializer.to_simple(data, {}))
+		self.assertEqual(serializer.to_json(data), expected)
+
+	def testRegisteredTypes(self):
+		import decimal
+
+		class Point(object):
+			def __init__(self, x, y):
+				self.x, self.y = x, y
+
+		serializer = Serializer()
+		serializer.register_type(Point, lambda data, options: [data.x, data.y])
+		data = {'where': Point(1, 2), 'list': (Point(3, 4), u'x', 'y'), 'amount': decimal.Decimal('1.50')}
+		self.assertEqual(serializer.to_simple(data, {}), {'where': [1, 2], 'list': [[3, 4], u'x', u'y'], 'amount': u'1.50'})
+		self.assertEqual(serializer.to_json(data), '{"amount": "1.50", "list": [[3, 4], "x", "y"], "where": [1, 2]}')
+
+		# Trusted output is handed to the engine as is.
+		self.assertEqual(serializer.to_json({'b': [1, 2], 'a': u'x'}, {'trusted': True}), '{"a": "x", "b": [1, 2]}')
+
+	def testDatetimeFormatting(self):
+		from django.utils import dateformat
+
+		values = [datetime.datetime(2012, 8, 17, 14, 15, 45), None, datetime.datetime(2012, 12, 1, 3, 4, 5)]
+		self.assertEqual(Serializer().format_datetimes(values), [u'2012-08-17T14:15:45', None, u'2012-12-01T03:04:05'])
+
+		serializer = Serializer(datetime_formatting='rfc-2822')
+		expected = [dateformat.format(values[0], 'r'), None, dateformat.format(values[2], 'r')]
+		self.assertEqual(serializer.format_datetimes(values), expected)
+		self.assertEqual(serializer.format_datetime(values[0]), expected[0])
+		self.assertEqual(serializer.format_date(values[0].date()), u'17 Aug 2012')
+		self.assertEqual(serializer.format_time(values[0].time()), dateformat.format(datetime.datetime(2000, 1, 1, 14, 15, 45), 'H:i:s O'))
+
+	@unittest.skipIf(lxml is None, "lxml is not installed")
+	def testIncrementalXML(self):
+		from lxml.etree import tostring
+		from restumize.bundle import Bundle
+
+		serializer = Serializer()
+		data = {'list': [1, 2.5, None, {'a': u'b'}], 'empty': [], 'bundle': Bundle(data={'when': datetime.datetime(2012, 8, 17)})}
+		self.assertEqual(serializer.to_xml(data), tostring(serializer.to_etree(data, {}), xml_declaration=True, encoding='utf-8'))
+
+		view = api.Api('test_api').wrap_view(StreamingHandler)
+		response = view(RequestFactory().get('/', {'count': 2, 'format': 'xml'}))
+		self.assertEqual(serializer.from_xml(''.join(response)), [{'id': 0}, {'id': 1}])
+
+		response = view(RequestFactory().get('/', {'count': 0, 'format': 'xml'}))
+		self.assertEqual(''.join(response), "<?xml version='1.0' encoding='utf-8'?>\n<objects/>")
+
+	def testStreamingDeserialization(self):
+		from restumize.exceptions import BadRequest
+
+		serializer = Serializer()
+		serializer.read_chunk_size = 4
+		content = '{"meta": {"total": 3}, "objects": [{"id": 1}, {"id": 22, "tags": ["a"]}, 3.5]}'
+		self.assertEqual(list(serializer.deserialize_stream(content)), [{'id': 1}, {'id': 22, 'tags': ['a']}, 3.5])
+		self.assertEqual(list(serializer.deserialize_stream('[1, 2]')), [1, 2])
+		self.assertEqual(list(serializer.deserialize_stream('{"id": 1}')), [{'id': 1}])
+
+		request = RequestFactory().post('/', content, content_type='application/json')
+		self.assertEqual(len(list(StreamingHandler()._deserialize_stream(request))), 3)
+
+		content = '[0.08489911224865752, -12e-3, {"a": 1.5}, 100]'
+		for size in (1, 2, 3, 5, 8, 13):
+			serializer.read_chunk_size = size
+			self.assertEqual(list(serializer.deserialize_stream(content)), [0.08489911224865752, -12e-3, {'a': 1.5}, 100])
+
+		for content in ('[1, 2', '[1] 2', '[' * 40 + ']' * 40):
+			self.assertRaises(BadRequest, list, serializer.deserialize_stream(content))
+
+		serializer.max_read_elements = 4
+		self.assertRaises(BadRequest, list, serializer.deserialize_stream('[[1, 2], [3]]'))
+		serializer.max_read_size = 10
+		self.assertRaises(BadRequest, list, serializer.deserialize_stream('[1, 2, 3, 4, 5]'))
+
+	@unittest.skipIf(msgpack is None, "msgpack is not installed")
+	def testMessagePack(self):
+		import decimal
+		from restumize.bundle import Bundle
+		from restumize.utils import utc
+
+		serializer = Serializer()
+		when = datetime.datetime(2012, 8, 17, 14, 15, 45, 120000, tzinfo=utc)
+		data = {'bundle': Bundle(data={'when': when, 'price': decimal.Decimal('1.50')}), 'items': (1, None, u'\xe9')}
+		self.assertEqual(serializer.from_msgpack(serializer.to_msgpack(data)), {u'bundle': {u'when': when, u'price': u'1.50'}, u'items': [1, None, u'\xe9']})
+
+		for when in (datetime.datetime(1970, 1, 1, 0, 0, 1, tzinfo=utc), datetime.datetime(1969, 7, 20, 20, 17, tzinfo=utc), datetime.datetime(2500, 1, 1, 0, 0, 0, 1, tzinfo=utc)):
+			self.assertEqual(serializer.from_msgpack(serializer.to_msgpack(when)), when)
+
+		# Timestamps written by other clients are read too.
+		self.assertEqual(serializer.from_msgpack('\xd6\xff\x00\x00\x00\x01'), datetime.datetime(1970, 1, 1, 0, 0, 1, tzinfo=utc))
+
+		response = api.Api('test_api').wrap_view(StreamingHandler)(RequestFactory().get('/', {'count': 2, 'format': 'msgpack'}))
+		self.assertTrue(response['Content-Type'].startswith('application/x-msgpack'))
+		self.assertEqual(serializer.from_msgpack(''.join(response)), [{u'id': 0}, {u'id': 1}])
+
+	@unittest.skipIf(cbor2 is None, "cbor2 is not installed")
+	def testCBOR(self):
+		import decimal
+		from restumize.bundle import Bundle
+		from restumize.utils import utc
+
+		serializer = Serializer()
+		when = datetime.datetime(2012, 8, 17, 14, 15, 45, tzinfo=utc)
+		data = {'bundle': Bundle(data={'when': when, 'price': decimal.Decimal('1.50')}), 'items': (1, None, 'a')}
+		self.assertEqual(serializer.from_cbor(serializer.to_cbor(data)), {u'bundle': {u'when': when, u'price': decimal.Decimal('1.50')}, u'items': [1, None, u'a']})
+
+		response = api.Api('test_api').wrap_view(StreamingHandler)(RequestFactory().get('/', {'count': 2}, HTTP_ACCEPT='application/cbor'))
+		self.assertTrue(response['Content-Type'].startswith('application/cbor'))
+		self.assertEqual(serializer.from_cbor(''.join(response)), [{u'id': 0}, {u'id': 1}])
+
+	def testRequestBody(self):
+		import json
+		view = api.Api('test_api').wrap_view(BodyHandler)
+		factory = RequestFactory()
+
+		request = factory.post('/', json.dumps({'count': 3, 'ratio': 1}), content_type='application/json; charset=utf-8')
+		self.assertEqual(json.loads(view(request).content), {'count': 3, 'ratio': 1.0})
+		self.assertEqual(request._restumize_body[1], {'count': 3, 'ratio': 1})
+
+		request = factory.put('/', json.dumps({'count': 4}), content_type='application/json')
+		request.method = 'PATCH'
+		self.assertEqual(json.loads(view(request).content), {'count': 4, 'ratio': None})
+
+		request = factory.put('/', 'count=5&ratio=0.5', content_type='application/x-www-form-urlencoded')
+		self.assertEqual(json.loads(view(request).content), {'count': 5, 'ratio': 0.5})
+
+		request = factory.post('/', '{"count": ', content_type='application/json')
+		self.assertEqual(view(request).status_code, 400)
+
+		# External entities are never resolved (XXE), YAML aliases refused.
+		import tempfile
+		secret = tempfile.NamedTemporaryFile(suffix='.txt')
+		secret.write('42')
+		secret.flush()
+		request = factory.post('/', '<!DOCTYPE object [<!ENTITY x SYSTEM "file://%s">]><object><count>&x;</count></object>' % secret.name, content_type='application/xml')
+		response = view(request)
+		self.assertEqual(response.status_code, 400)
+		self.assertEqual(request._restumize_body[1], {'count': None})
+
+		request = factory.post('/', 'a: &a [1, 2]\nb: [*a, *a]\ncount: 1\n', content_type='text/yaml')
+		self.assertEqual(view(request).status_code, 400)
+
+		self.assertEqual(fields.IntegerField().clean(7L), 7L)
+		self.assertRaises(handler.ValidationError, fields.IntegerField().clean, True)
+
+	def testRequestLimits(self):
+		import json
+		from StringIO import StringIO
+		view = api.Api('test_api').wrap_view(LimitedHandler)
+		factory = RequestFactory()
+
+		response = view(factory.post('/', json.dumps({'count': 1, 'blob': 'x' * 1000}), content_type='application/json'))
+		self.assertEqual(response.status_code, 413)
+		self.assertEqual(json.loads(response.content), {'error': 'The request body is larger than 1000 bytes.'})
+
+		response = view(factory.post('/', 'count=1&a=1&b=2&c=3', content_type='application/x-www-form-urlencoded'))
+		self.assertEqual(response.status_code, 413)
+		response = view(factory.post('/', json.dumps({'count': 1, 'a': 1, 'b': 2, 'c': 3}), content_type='application/json'))
+		self.assertEqual(response.status_code, 413)
+
+		upload = StringIO('x' * 11)
+		upload.name = 'big.txt'
+		response = view(factory.post('/', {'count': 1, 'upload': upload}))
+		self.assertEqual(response.status_code, 413)
+		self.assertEqual(json.loads(response.content), {'error': 'A file can be at most 10 bytes.'})
+
+		upload = StringIO('x' * 10)
+		upload.name = 'small.txt'
+		response = view(factory.post('/', {'count': 1, 'upload': upload}))
+		self.assertEqual(response.status_code, 200)
+
+	def testCompressedRequest(self):
+		import gzip, json, zlib
+		from StringIO import StringIO
+		view = api.Api('test_api').wrap_view(CompressedHandler)
+		factory = RequestFactory()
+		body = json.dumps({'count': 3, 'ratio': 0.5, 'padding': 'x' * 100})
+
+		buffer = StringIO()
+		with gzip.GzipFile(fileobj=buffer, mode='wb') as compressed:
+			compressed.write(body)
+
+		request = factory.post('/', buffer.getvalue(), content_type='application/json', HTTP_CONTENT_ENCODING='gzip')
+		self.assertEqual(json.loads(view(request).content), {'count': 3, 'ratio': 0.5})
+
+		request = factory.post('/', zlib.compress('count=4'), content_type='application/x-www-form-urlencoded', HTTP_CONTENT_ENCODING='deflate')
+		self.assertEqual(json.loads(view(request).content), {'count': 4, 'ratio': None})
+
+		request = factory.post('/', zlib.compress(json.dumps({'count': 1, 'padding': 'x' * 100000})), content_type='application/json', HTTP_CONTENT_ENCODING='deflate')
+		self.assertEqual(view(request).status_code, 413)
+
+		request = factory.post('/', 'not compressed', content_type='application/json', HTTP_CONTENT_ENCODING='gzip')
+		self.assertEqual(view(request).status_code, 400)
+
+		request = factory.post('/', body, content_type='application/json', HTTP_CONTENT_ENCODING='compress')
+		self.assertEqual(view(request).status_code, 415)
+		request = factory.post('/', buffer.getvalue(), content_type='application/json', HTTP_CONTENT_ENCODING='gzip')
+		self.assertEqual(api.Api('test_api').wrap_view(BodyHandler)(request).status_code, 415)
+
+	@unittest.skipIf(not compression.bounded_brotli, "brotli 1.1 or later is not installed")
+	def testBrotliBomb(self):
+		import brotli
+		from StringIO import StringIO
+		from restumize.exceptions import RequestTooLarge
+
+		bomb = brotli.compress('\0' * 20 * 1024 * 1024)
+		self.assertTrue(len(bomb) < 1024)
+		stream = compression.DecompressingStream(StringIO(bomb), compression.get_decoder('br'), 1024 * 1024)
+		self.assertRaises(RequestTooLarge, stream.read)
+		self.assertTrue(stream.size <= 1024 * 1024 + 2 * stream.chunk_size)
+
+		body = 'count=6&padding=' + 'x' * 100000
+		stream = compression.DecompressingStream(StringIO(brotli.compress(body)), compression.get_decoder('br'), len(body))
+		self.assertEqual(stream.read(), body)
+
 	def testUrl(self):
 		apiset = api.Api('test_api')
 		apiset.register(TestHandler)
@@ -126,3 +816,49 @@ class ResourceTestCase(unittest.TestCase):
 		resource_class = apiset._registry[resource_name]
 		view = apiset.wrap_view(resource_class)
 
+
+class CacheTagsTestCase(TestCase):
+
+	def testCacheTags(self):
+		self.assertEqual(TaggedHandler._meta.cache_tags, ('auth.user', 'profiles'))
+		view = api.Api('test_api').wrap_view(TaggedHandler)
+		factory = RequestFactory()
+		del CachedHandler.calls[:]
+
+		view(factory.get('/', {'name': 'abc'}))
+		view(factory.get('/', {'name': 'abc'}))
+		self.assertEqual(len(CachedHandler.calls), 1)
+
+		invalidate_tags('profiles')
+		view(factory.get('/', {'name': 'abc'}))
+		self.assertEqual(len(CachedHandler.calls), 2)
+
+		user = User.objects.create(username='tagged')
+		view(factory.get('/', {'name': 'abc'}))
+		view(factory.get('/', {'name': 'abc'}))
+		self.assertEqual(len(CachedHandler.calls), 3)
+
+		# Proxy and deferred instances invalidate the tag of their model.
+		self.assertEqual(get_tag(ProxyUser), 'auth.user')
+		ProxyUser.objects.get(pk=user.pk).save()
+		view(factory.get('/', {'name': 'abc'}))
+		self.assertEqual(len(CachedHandler.calls), 4)
+
+		User.objects.only('username').get(pk=user.pk).save()
+		view(factory.get('/', {'name': 'abc'}))
+		self.assertEqual(len(CachedHandler.calls), 5)
+
+	def testLocalTagVersions(self):
+		from django.core.cache import cache
+		versions = get_tag_versions(['local'])
+		self.assertEqual(local_tag_versions.get(get_tag_key('local')), versions[0])
+
+		# Bumped by another process: unnoticed until the local copy expires.
+		cache.incr(get_tag_key('local'))
+		self.assertEqual(get_tag_versions(['local']), versions)
+		local_tag_versions.clear()
+		self.assertEqual(get_tag_versions(['local']), [versions[0] + 1])
+
+		# Bumped by this process: seen at once.
+		invalidate_tags('local')
+		self.assertEqual(get_tag_versions(['local']), [versions[0] + 2])
@@ -0,0 +1,38 @@
+from django.core.files.uploadhandler import FileUploadHandler
+
+from restumize.exceptions import RequestTooLarge
+
+
+class LimitedUploadHandler(FileUploadHandler):
+    """
+    Enforces the upload limits of a resource while Django streams a
+    multipart body, before the files are stored anywhere.
+
+    Installed in front of the other upload handlers by ``BaseHandler``.
+    Raises ``RequestTooLarge`` as soon as the request holds more than
+    ``max_files`` files or a file grows past ``max_file_size`` bytes.
+    """
+    def __init__(self, request=None, max_files=None, max_file_size=None):
+        super(LimitedUploadHandler, self).__init__(request)
+        self.max_files = max_files
+        self.max_file_size = max_file_size
+        self.file_count = 0
+
+    def new_file(self, field_name, file_name, content_type, content_length, charset=None):
+        self.file_count += 1
+
+        if self.max_files is not None and self.file_count > self.max_files:
+            raise RequestTooLarge('A request can hold at most %d files.' % self.max_files)
+
+        if self.max_file_size is not None and content_length is not None and content_length > self.max_file_size:
+            raise RequestTooLarge('A file can be at most %d bytes.' % self.max_file_size)
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.max_file_size is not None and start + len(raw_data) > self.max_file_size:
+            raise RequestTooLarge('A file can be at most %d bytes.' % self.max_file_size)
+
+        return raw_data
+
+    def file_complete(self, file_size):
+        # Leaves the file to the next handlers.
+        return None
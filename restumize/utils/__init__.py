@@ -1,5 +1,6 @@
 from restumize.utils.dict import dict_strip_unicode_keys
-from restumize.utils.formatting import mk_datetime, format_datetime, format_date, format_time
+from restumize.utils.lru import LRUCache
+from restumize.utils.formatting import mk_datetime, format_datetime, format_date, format_time, format_datetimes, format_iso_datetimes
 from restumize.utils.urls import trailing_slash
 from restumize.utils.validate_jsonp import is_valid_jsonp_callback_value
-from restumize.utils.timezone import now, make_aware, make_naive, aware_date, aware_datetime
+from restumize.utils.timezone import now, make_aware, make_naive, aware_date, aware_datetime, get_timezone_settings, to_aware, utc
@@ -1,8 +1,7 @@
 import email
 import datetime
 import time
-from django.utils import dateformat
-from restumize.utils.timezone import make_aware, make_naive, aware_datetime
+from restumize.utils.timezone import make_aware, make_naive, get_timezone_settings, setting_changed
 
 # Try to use dateutil for maximum date-parsing niceness. Fall back to
 # hard-coded RFC2822 parsing if that's not possible.
@@ -12,25 +11,121 @@ except ImportError:
     def mk_datetime(string):
         return make_aware(datetime.datetime.fromtimestamp(time.mktime(email.utils.parsedate(string))))
 
+# RFC 2822 names are always English.
+WEEKDAYS = (u'Mon', u'Tue', u'Wed', u'Thu', u'Fri', u'Sat', u'Sun')
+MONTHS = (None, u'Jan', u'Feb', u'Mar', u'Apr', u'May', u'Jun', u'Jul', u'Aug', u'Sep', u'Oct', u'Nov', u'Dec')
+
+# Formatted UTC offsets of the local timezone by ``(year, month, day, hour)``
+# (DST changes on the hour) and of ``format_time`` by hour.
+_local_offsets = {}
+_time_offsets = {}
+MAX_CACHED_OFFSETS = 10000
+
+def format_offset(offset):
+    """
+    Formats a ``timedelta`` UTC offset like "+0200" or "-0430".
+    """
+    seconds = offset.days * 86400 + offset.seconds
+    sign = u'-' if seconds < 0 else u'+'
+    seconds = abs(seconds)
+    return u"%s%02d%02d" % (sign, seconds // 3600, (seconds // 60) % 60)
+
+def get_local_offset(dt):
+    """
+    Returns the formatted UTC offset of the local timezone at the naive
+    datetime ``dt``, the way Django's ``dateformat`` computes it.
+    """
+    if not time.daylight:
+        return format_offset(datetime.timedelta(seconds=-time.timezone))
+
+    key = (dt.year, dt.month, dt.day, dt.hour)
+
+    try:
+        return _local_offsets[key]
+    except KeyError:
+        pass
+
+    tt = (dt.year, dt.month, dt.day, dt.hour, dt.minute, dt.second, dt.weekday(), 0, 0)
+
+    try:
+        stamp = time.mktime(tt)
+    except (OverflowError, ValueError):
+        # Only the DST flag matters, see ``django.utils.tzinfo``.
+        stamp = time.mktime((2037,) + tt[1:])
+
+    if time.localtime(stamp).tm_isdst > 0:
+        offset = format_offset(datetime.timedelta(seconds=-time.altzone))
+    else:
+        offset = format_offset(datetime.timedelta(seconds=-time.timezone))
+
+    if len(_local_offsets) >= MAX_CACHED_OFFSETS:
+        _local_offsets.clear()
+
+    _local_offsets[key] = offset
+    return offset
+
+def get_offset(dt):
+    """
+    Returns the formatted UTC offset of ``dt``; naive datetimes are in the
+    local timezone.
+    """
+    if dt.tzinfo is not None:
+        offset = dt.utcoffset()
+
+        if offset is not None:
+            return format_offset(offset)
+
+    return get_local_offset(dt)
+
 def format_datetime(dt):
     """
     RFC 2822 datetime formatter
     """
-    return dateformat.format(make_naive(dt), 'r')
+    dt = make_naive(dt)
+    return u"%s, %d %s %d %02d:%02d:%02d %s" % (WEEKDAYS[dt.weekday()], dt.day, MONTHS[dt.month], dt.year, dt.hour, dt.minute, dt.second, get_offset(dt))
+
+def format_datetimes(values):
+    """
+    RFC 2822 formatter for a sequence of datetimes. ``None`` values are kept.
+    """
+    return [value is not None and format_datetime(value) or None for value in values]
+
+def format_iso_datetimes(values):
+    """
+    ISO 8601 formatter for a sequence of datetimes, converting aware ones to
+    the default timezone like ``make_naive``. ``None`` values are kept.
+    """
+    use_tz, default_tz = get_timezone_settings()
+
+    if not use_tz:
+        return [value is not None and value.isoformat() or None for value in values]
+
+    return [value is not None and make_naive(value).isoformat() or None for value in values]
 
 def format_date(d):
     """
     RFC 2822 date formatter
     """
-    # workaround because Django's dateformat utility requires a datetime
-    # object (not just date)
-    dt = aware_datetime(d.year, d.month, d.day, 0, 0, 0)
-    return dateformat.format(dt, 'j M Y')
+    return u"%d %s %d" % (d.day, MONTHS[d.month], d.year)
 
 def format_time(t):
     """
     RFC 2822 time formatter
     """
-    # again, workaround dateformat input requirement
-    dt = aware_datetime(2000, 1, 1, t.hour, t.minute, t.second)
-    return dateformat.format(dt, 'H:i:s O')
+    # The offset is the one of the time on 2000-01-01.
+    try:
+        offset = _time_offsets[t.hour]
+    except KeyError:
+        offset = _time_offsets[t.hour] = get_offset(make_aware(datetime.datetime(2000, 1, 1, t.hour)))
+
+    return u"%02d:%02d:%02d %s" % (t.hour, t.minute, t.second, offset)
+
+def reset_offsets(**kwargs):
+    """
+    Drops the cached offsets when ``USE_TZ`` or ``TIME_ZONE`` change.
+    """
+    if kwargs.get('setting') in (None, 'USE_TZ', 'TIME_ZONE'):
+        _local_offsets.clear()
+        _time_offsets.clear()
+
+setting_changed.connect(reset_offsets, dispatch_uid='restumize.utils.formatting.reset_offsets')
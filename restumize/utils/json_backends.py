@@ -0,0 +1,104 @@
+"""
+Swappable JSON engines for ``Serializer.to_json``/``from_json``.
+
+The engine is picked with ``settings.RESTUMIZE_JSON_BACKEND`` (or the
+``json_backend`` argument of ``Serializer``) among ``simplejson`` (the
+default, ``django.utils.simplejson``), ``json`` (the standard library) and
+``ujson`` (1.x, the releases supporting Python 2).
+
+``simplejson`` and ``json`` hand values JSON has no type for (datetimes,
+``Decimal``...) to the ``default`` callable given to ``dumps``, so they are
+rendered the same way whatever the engine.
+
+``ujson`` has no ``default`` hook, so ``Serializer`` runs ``to_simple``
+before handing it the data. It encodes several times faster, but its output
+is compact (no spaces after separators) and floats are rounded to 15
+decimal places.
+"""
+import inspect
+import json
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import simplejson
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+
+# Renders datetimes, dates, times and ``Decimal`` like Django does.
+django_default = DjangoJSONEncoder().default
+
+# simplejson 2.1+ encodes ``Decimal`` and namedtuples itself, without calling
+# ``default``; these options keep the output the same as the standard library.
+SIMPLEJSON_OPTIONS = {
+    'use_decimal': False,
+    'namedtuple_as_object': False,
+    'tuple_as_array': True,
+}
+
+
+class SimpleJSONBackend(object):
+    """
+    Encodes and decodes JSON with ``django.utils.simplejson``.
+    """
+    module = simplejson
+    supports_default = True
+
+    def __init__(self):
+        # ``django.utils.simplejson`` is the standard library or simplejson,
+        # depending on what is installed.
+        arguments = inspect.getargspec(self.module.dumps)[0]
+        self.options = dict((name, value) for (name, value) in SIMPLEJSON_OPTIONS.items() if name in arguments)
+
+    def dumps(self, data, default=None, sort_keys=True):
+        return self.module.dumps(data, default=default or django_default, sort_keys=sort_keys, ensure_ascii=False, **self.options)
+
+    def loads(self, content):
+        return self.module.loads(content)
+
+
+class StandardJSONBackend(SimpleJSONBackend):
+    """
+    Encodes and decodes JSON with the standard library ``json`` module.
+    """
+    module = json
+
+
+class UltraJSONBackend(object):
+    """
+    Encodes and decodes JSON with ``ujson``. Only takes simplified data.
+    """
+    module = ujson
+    supports_default = False
+
+    def dumps(self, data, default=None, sort_keys=True):
+        # Like the other engines, returns ``unicode`` (``ujson`` gives UTF-8).
+        return self.module.dumps(data, sort_keys=sort_keys, ensure_ascii=False, escape_forward_slashes=False, double_precision=15).decode('utf-8')
+
+    def loads(self, content):
+        return self.module.loads(content, precise_float=True)
+
+
+# Name -> backend class.
+JSON_BACKENDS = (
+    ('json', StandardJSONBackend),
+    ('simplejson', SimpleJSONBackend),
+    ('ujson', UltraJSONBackend),
+)
+
+
+def get_json_backend(name):
+    """
+    Returns an instance of the JSON backend called ``name``.
+    """
+    for backend_name, backend_class in JSON_BACKENDS:
+        if name == backend_name:
+            if backend_class.module is None:
+                raise ImproperlyConfigured("The '%s' JSON backend requires the %s module." % (name, name))
+
+            return backend_class()
+
+    raise ImproperlyConfigured("Unknown JSON backend '%s'. Choose one of %s." % (name, ', '.join("'%s'" % backend[0] for backend in JSON_BACKENDS)))
@@ -0,0 +1,100 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache(object):
+    """
+    A bounded, thread-safe, least-recently-used mapping.
+
+    Accepts a number of optional kwargs::
+
+        * ``max_entries`` - the number of entries kept before the least
+          recently used ones are evicted. Default is 1024.
+        * ``max_size`` - the total ``size`` of the entries kept before the
+          least recently used ones are evicted. Default is ``None`` (only
+          ``max_entries`` applies).
+        * ``timeout`` - the number of seconds an entry is kept when no
+          timeout is given to ``set``. Default is ``None`` (never expire).
+
+    Keeps ``hits`` and ``misses`` counters.
+    """
+    def __init__(self, max_entries=1024, max_size=None, timeout=None):
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self.timeout = timeout
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        """
+        Returns the value stored under ``key`` (marking it as recently used)
+        or ``default`` if it is missing or expired.
+        """
+        with self._lock:
+            try:
+                value, size, expires = self._entries.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+
+            if expires is not None and expires <= time.time():
+                self.size -= size
+                self.misses += 1
+                return default
+
+            self._entries[key] = (value, size, expires)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, size=1, timeout=None):
+        """
+        Stores ``value`` under ``key``, evicting the least recently used
+        entries if the cache grows past its bounds.
+
+        Values larger than ``max_size`` on their own are not stored.
+        """
+        if timeout is None:
+            timeout = self.timeout
+
+        expires = None
+
+        if timeout is not None:
+            expires = time.time() + timeout
+
+        with self._lock:
+            if key in self._entries:
+                self.size -= self._entries.pop(key)[1]
+
+            if self.max_size is not None and size > self.max_size:
+                return
+
+            self._entries[key] = (value, size, expires)
+            self.size += size
+
+            while len(self._entries) > self.max_entries or (self.max_size is not None and self.size > self.max_size):
+                self.size -= self._entries.popitem(last=False)[1][1]
+
+    def delete(self, key):
+        """
+        Removes ``key`` from the cache, if present.
+        """
+        with self._lock:
+            if key in self._entries:
+                self.size -= self._entries.pop(key)[1]
+
+    def clear(self):
+        """
+        Removes every entry and resets the counters.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+            self.hits = 0
+            self.misses = 0
@@ -1,6 +1,3 @@
-import mimeparse
-
-
 def determine_format(request, serializer, default_format='application/json'):
     """
     Tries to "smartly" determine which output format is desired.
@@ -25,12 +22,7 @@ def determine_format(request, serializer, default_format='application/json'):
     
     # Try to fallback on the Accepts header.
     if request.META.get('HTTP_ACCEPT', '*/*') != '*/*':
-        formats = list(serializer.supported_formats) or []
-        # Reverse the list, because mimeparse is weird like that. See also
-        # https://github.com/toastdriven/django-tastypie/issues#issue/12 for
-        # more information.
-        formats.reverse()
-        best_format = mimeparse.best_match(formats, request.META['HTTP_ACCEPT'])
+        best_format = serializer.get_mime_for_accept(request.META['HTTP_ACCEPT'])
         
         if best_format:
             return best_format
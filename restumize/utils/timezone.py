@@ -1,30 +1,88 @@
 import datetime
 from django.conf import settings
+from django.utils.tzinfo import FixedOffset, LocalTimezone
+
+try:
+    from django.core.signals import setting_changed
+except ImportError:
+    from django.test.signals import setting_changed
+
+# ``(USE_TZ, default timezone)``, looked up once instead of for every value.
+_timezone_settings = None
 
 try:
     from django.utils import timezone
 
+    def get_timezone_settings():
+        """
+        Returns a cached ``(USE_TZ, default timezone)`` snapshot of the
+        settings.
+        """
+        global _timezone_settings
+
+        if _timezone_settings is None:
+            use_tz = getattr(settings, "USE_TZ", False)
+            _timezone_settings = (use_tz, use_tz and timezone.get_default_timezone() or None)
+
+        return _timezone_settings
+
     def make_aware(value):
-        if getattr(settings, "USE_TZ", False) and timezone.is_naive(value):
-            default_tz = timezone.get_default_timezone()
+        use_tz, default_tz = get_timezone_settings()
+        if use_tz and timezone.is_naive(value):
             value = timezone.make_aware(value, default_tz)
         return value
 
     def make_naive(value):
-        if getattr(settings, "USE_TZ", False) and timezone.is_aware(value):
-            default_tz = timezone.get_default_timezone()
+        if value.tzinfo is None:
+            return value
+        use_tz, default_tz = get_timezone_settings()
+        if use_tz and timezone.is_aware(value):
             value = timezone.make_naive(value, default_tz)
         return value
 
     def now():
         return timezone.localtime(timezone.now())
 
+    utc = timezone.utc
+
 except ImportError:
     now = datetime.datetime.now
     make_aware = make_naive = lambda x: x
 
+    def get_timezone_settings():
+        return (False, None)
+
+    utc = FixedOffset(0)
+
 def aware_date(*args, **kwargs):
     return make_aware(datetime.date(*args, **kwargs))
 
 def aware_datetime(*args, **kwargs):
     return make_aware(datetime.datetime(*args, **kwargs))
+
+def to_aware(value):
+    """
+    Returns the datetime ``value`` with a timezone attached: naive datetimes
+    are in the default timezone with ``USE_TZ``, in local time otherwise.
+    """
+    if value.tzinfo is not None:
+        return value
+
+    use_tz, default_tz = get_timezone_settings()
+
+    if use_tz:
+        return timezone.make_aware(value, default_tz)
+
+    return value.replace(tzinfo=LocalTimezone(value))
+
+def reset_timezone_settings(**kwargs):
+    """
+    Drops the settings snapshot when ``USE_TZ`` or ``TIME_ZONE`` change
+    (e.g. with ``override_settings`` in tests).
+    """
+    global _timezone_settings
+
+    if kwargs.get('setting') in (None, 'USE_TZ', 'TIME_ZONE'):
+        _timezone_settings = None
+
+setting_changed.connect(reset_timezone_settings, dispatch_uid='restumize.utils.timezone.reset_timezone_settings')